@@ -0,0 +1,229 @@
+import sys
+import os
+import glob
+import time
+import queue
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from visual_vector_slices import (parse_problem_file, parse_slices_file, build_tag_index, parse_posiciones_file,
+                                  report_unresolved_tags, layout_bins, render_layout_pdf)
+from duplicates import group_pieces
+
+# Marks the end of the stream on every queue between the stages.
+_DONE = object()
+
+
+def find_projects(paths):
+    """Collects (shapes, posiciones, slices) triples from files and directories.
+
+    A project is identified by its `<name>-Shapes.txt` file; the positions and
+    slices files must sit next to it as `<name>-posiciones.txt` and
+    `<name>-slices.txt`. Directories are searched for Shapes files.
+
+    Returns:
+        A list of (name, shapes_file, positions_file, slices_file) tuples and a
+        list of Shapes files whose companions were not found.
+    """
+    shapes_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            shapes_files.extend(sorted(glob.glob(os.path.join(path, '*-Shapes.txt'))))
+        else:
+            shapes_files.append(path)
+    projects = []
+    incomplete = []
+    for shapes_file in shapes_files:
+        base = shapes_file[:-len('-Shapes.txt')] if shapes_file.endswith('-Shapes.txt') else os.path.splitext(shapes_file)[0]
+        positions_file = f"{base}-posiciones.txt"
+        slices_file = f"{base}-slices.txt"
+        if os.path.exists(positions_file) and os.path.exists(slices_file):
+            projects.append((os.path.basename(base), shapes_file, positions_file, slices_file))
+        else:
+            incomplete.append(shapes_file)
+    return projects, incomplete
+
+
+def _read_project(project):
+    """Stage 1: reads and parses the three files of a project and groups identical pieces."""
+    name, shapes_file, positions_file, slices_file = project
+    start = time.perf_counter()
+    bin_dimension, original_pieces_data = parse_problem_file(shapes_file)
+    labels = parse_slices_file(slices_file)
+    unresolved = []
+    bins_data = parse_posiciones_file(positions_file, build_tag_index(labels), unresolved)
+    report_unresolved_tags(unresolved, positions_file)
+    return {'name': name, 'bin_dimension': bin_dimension, 'pieces': original_pieces_data,
+            'groups': group_pieces(original_pieces_data), 'labels': labels, 'bins': bins_data,
+            'read_time': time.perf_counter() - start}
+
+
+def _record_error(stats, name, error):
+    with stats['lock']:
+        stats['errors'].append(f"{name}: {error}")
+
+
+def _reader_stage(projects, parsed_queue, readers, workers, stats):
+    """Feeds parsed projects into the bounded queue in submission order."""
+    try:
+        with ThreadPoolExecutor(max_workers=readers) as pool:
+            # Only keep `readers` reads in flight so the queue bound still applies.
+            pending = []
+            for project in projects:
+                pending.append((project, pool.submit(_read_project, project)))
+                if len(pending) >= readers:
+                    _forward_read(pending.pop(0), parsed_queue, stats)
+            for item in pending:
+                _forward_read(item, parsed_queue, stats)
+    except Exception as e:
+        _record_error(stats, "reader", e)
+    finally:
+        # Every layout worker needs its own end marker, whatever happened above.
+        for _ in range(workers):
+            parsed_queue.put(_DONE)
+
+
+def _forward_read(item, parsed_queue, stats):
+    project, future = item
+    try:
+        parsed = future.result()
+    except Exception as e:
+        _record_error(stats, project[0], e)
+        return
+    with stats['lock']:
+        stats['read'] += parsed['read_time']
+    parsed_queue.put(parsed)
+
+
+def _layout_stage(parsed_queue, layout_queue, stats):
+    """Stage 2: transforms the pieces and finds the label anchors."""
+    busy = 0.0
+    try:
+        while True:
+            project = parsed_queue.get()
+            if project is _DONE:
+                break
+            start = time.perf_counter()
+            try:
+                project['layouts'] = layout_bins(project['bins'], project['pieces'], project['labels'],
+                                                 project['groups'])
+            except Exception as e:
+                _record_error(stats, project['name'], e)
+                continue
+            finally:
+                busy += time.perf_counter() - start
+            layout_queue.put(project)
+    finally:
+        with stats['lock']:
+            stats['layout'] += busy
+        layout_queue.put(_DONE)
+
+
+def _writer_stage(layout_queue, output_dir, workers, render_options, stats):
+    """Stage 3: writes one PDF per project as soon as its layout is ready.
+
+    A project that fails to render is recorded, render_layout_pdf removes
+    its unfinished PDF, and the queue is still drained to the last end
+    marker, so the other stages are never left blocked on a full queue.
+    """
+    finished_workers = 0
+    busy = 0.0
+    while finished_workers < workers:
+        project = layout_queue.get()
+        if project is _DONE:
+            finished_workers += 1
+            continue
+        start = time.perf_counter()
+        file_name = os.path.join(output_dir, f"{project['name']}-Shapes.pdf")
+        try:
+            render_layout_pdf(project['layouts'], project['bin_dimension'], file_name=file_name, **render_options)
+        except Exception as e:
+            _record_error(stats, project['name'], e)
+            continue
+        finally:
+            busy += time.perf_counter() - start
+        vertices = sum(len(piece['vertices']) for placed in project['layouts'] for piece in placed)
+        with stats['lock']:
+            stats['projects'] += 1
+            stats['vertices'] += vertices
+        print(f"  {project['name']}: {len(project['layouts'])} bins, {vertices} vertices -> {file_name}")
+    stats['write'] = busy
+
+
+def run_pipeline(projects, output_dir=".", readers=2, workers=1, queue_size=2, render_options=None):
+    """Renders a queue of projects with reading, layout and writing overlapped.
+
+    The three stages run in their own threads and are connected by bounded
+    queues of `queue_size` projects, so the disk is read while earlier
+    projects are laid out and written, without holding the whole batch in
+    memory.
+
+    Args:
+        projects: (name, shapes_file, positions_file, slices_file) tuples as
+            returned by find_projects.
+        output_dir: Directory the PDFs are written to.
+        readers: Number of threads reading and parsing input files.
+        workers: Number of layout threads.
+        queue_size: Maximum number of projects waiting between two stages.
+        render_options: Extra keyword arguments for render_layout_pdf.
+
+    Returns:
+        A dict with the number of 'projects' and 'vertices' written, the
+        'elapsed' wall time, the busy time of each stage ('read', 'layout',
+        'write') and the list of 'errors'.
+    """
+    stats = {'projects': 0, 'vertices': 0, 'read': 0.0, 'layout': 0.0, 'write': 0.0,
+             'errors': [], 'lock': threading.Lock()}
+    parsed_queue = queue.Queue(maxsize=queue_size)
+    layout_queue = queue.Queue(maxsize=queue_size)
+    start = time.perf_counter()
+    threads = [threading.Thread(target=_reader_stage, args=(projects, parsed_queue, readers, workers, stats))]
+    threads += [threading.Thread(target=_layout_stage, args=(parsed_queue, layout_queue, stats))
+                for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    _writer_stage(layout_queue, output_dir, workers, render_options or {}, stats)
+    for thread in threads:
+        thread.join()
+    stats['elapsed'] = time.perf_counter() - start
+    del stats['lock']
+    return stats
+
+
+def main():
+    """Renders every project found in the given files or directories."""
+    parser = argparse.ArgumentParser(description="Render a batch of nesting projects with overlapped I/O.")
+    parser.add_argument("inputs", nargs="+", help="project directories or *-Shapes.txt files")
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--readers", type=int, default=2, help="parser threads (default: 2)")
+    parser.add_argument("--workers", type=int, default=1, help="layout threads (default: 1)")
+    parser.add_argument("--queue-size", type=int, default=2, help="projects buffered between stages (default: 2)")
+    parser.add_argument("--precision", type=float, default=0.01)
+    parser.add_argument("--compression", type=int, default=6, choices=range(10), metavar="0-9")
+    parser.add_argument("--streaming", action="store_true",
+                        help="write each page to disk as soon as it is drawn; this only saves the reportlab "
+                             "document, as every bin of a project is still laid out in memory before writing")
+    args = parser.parse_args()
+
+    projects, incomplete = find_projects(args.inputs)
+    for shapes_file in incomplete:
+        print(f"Warning: skipping '{shapes_file}', posiciones or slices file not found")
+    if not projects:
+        print("Error: No complete projects found")
+        sys.exit(1)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    stats = run_pipeline(projects, output_dir=args.output_dir, readers=max(1, args.readers),
+                         workers=max(1, args.workers), queue_size=max(1, args.queue_size),
+                         render_options={'precision': args.precision or None,
+                                         'compression_level': args.compression, 'streaming': args.streaming})
+    for error in stats['errors']:
+        print(f"Error: {error}")
+    elapsed = stats['elapsed']
+    print(f"Rendered {stats['projects']} projects ({stats['vertices']} vertices) in {elapsed:.2f}s: "
+          f"{stats['projects'] / elapsed:.2f} projects/s, {stats['vertices'] / elapsed:.0f} vertices/s")
+    print(f"Stage busy time: read {stats['read']:.2f}s, layout {stats['layout']:.2f}s, write {stats['write']:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import sys
+import os
+import math
+import time
+import argparse
+from collections import defaultdict
+
+import numpy as np
+
+from visual_vector_slices import (parse_problem_file, parse_slices_file, build_tag_index, parse_posiciones_file,
+                                  report_unresolved_tags, place_piece)
+from cut_order import outline_array
+
+
+def _edges(outline):
+    """Returns the (start, end) points of every non-degenerate edge of a closed outline."""
+    if len(outline) > 1 and np.array_equal(outline[0], outline[-1]):
+        outline = outline[:-1]
+    starts = outline
+    ends = np.roll(outline, -1, axis=0)
+    keep = np.hypot(*(ends - starts).T) > 1e-9
+    return starts[keep], ends[keep]
+
+
+class EdgeHash:
+    """Spatial hash of edges keyed by their supporting line.
+
+    An edge is hashed by the direction of its line (modulo 180°) and the
+    line's signed distance from the origin, both bucketed by the tolerance,
+    so collinear edges land in the same or a neighbouring bucket no matter
+    where along the line they lie.
+    """
+
+    def __init__(self, tolerance=0.5, angle_tolerance=0.5):
+        self.tolerance = tolerance
+        self.angle_step = math.radians(angle_tolerance)
+        self.angle_buckets = max(1, int(round(math.pi / self.angle_step)))
+        self.buckets = defaultdict(list)
+        self.edges = []
+
+    def _line(self, start, end):
+        direction = end - start
+        angle = math.atan2(direction[1], direction[0]) % math.pi
+        unit = np.array([math.cos(angle), math.sin(angle)])
+        offset = float(start[0] * -unit[1] + start[1] * unit[0])
+        return angle, unit, offset
+
+    def add(self, part, start, end):
+        angle, _, offset = self._line(start, end)
+        key = (int(angle / self.angle_step) % self.angle_buckets, int(math.floor(offset / self.tolerance)))
+        self.buckets[key].append(len(self.edges))
+        self.edges.append((part, start, end))
+
+    def candidates(self, start, end):
+        """Yields the indices of edges whose line is within tolerance of this edge's line."""
+        angle, _, offset = self._line(start, end)
+        angle_key = int(angle / self.angle_step) % self.angle_buckets
+        offset_key = int(math.floor(offset / self.tolerance))
+        for da in (-1, 0, 1):
+            a = angle_key + da
+            # Directions just below 180° wrap around to 0°, where the offset changes sign.
+            o_key = offset_key
+            if a < 0 or a >= self.angle_buckets:
+                a %= self.angle_buckets
+                o_key = int(math.floor(-offset / self.tolerance))
+            for do in (-1, 0, 1):
+                yield from self.buckets.get((a, o_key + do), ())
+
+
+def _overlap_intervals(edge_hash, part, start, end, owners_before, min_length):
+    """Returns the [t0, t1] intervals along an edge already cut by an earlier part."""
+    direction = end - start
+    length = float(np.hypot(*direction))
+    unit = direction / length
+    normal = np.array([-unit[1], unit[0]])
+    intervals = []
+    for index in edge_hash.candidates(start, end):
+        other_part, other_start, other_end = edge_hash.edges[index]
+        if other_part == part or other_part not in owners_before:
+            continue
+        # Both endpoints of the other edge must lie on this edge's line.
+        if abs(float((other_start - start) @ normal)) > edge_hash.tolerance or \
+                abs(float((other_end - start) @ normal)) > edge_hash.tolerance:
+            continue
+        t0, t1 = sorted((float((other_start - start) @ unit), float((other_end - start) @ unit)))
+        t0, t1 = max(t0, 0.0), min(t1, length)
+        if t1 - t0 >= min_length:
+            intervals.append((t0, t1))
+    return length, intervals
+
+
+def _subtract(length, intervals):
+    """Returns the parts of [0, length] not covered by the intervals."""
+    kept = []
+    position = 0.0
+    for t0, t1 in sorted(intervals):
+        if t0 > position:
+            kept.append((position, t0))
+        position = max(position, t1)
+    if position < length:
+        kept.append((position, length))
+    return kept
+
+
+def merge_common_edges(outlines, tolerance=0.5, angle_tolerance=0.5, min_length=1.0):
+    """Builds the cut geometry of one bin with every shared edge cut only once.
+
+    Parts are processed in order; a stretch of an edge that is collinear with
+    and overlaps an edge of an earlier part (within `tolerance` mm) is left
+    to that part and dropped here.
+
+    Args:
+        outlines: (n, 2) arrays with the placed outline of each part.
+        tolerance: Maximum distance between two edges considered the same cut.
+        angle_tolerance: Maximum angle in degrees between them.
+        min_length: Shared stretches shorter than this are still cut twice.
+
+    Returns:
+        A list of polylines (lists of (x, y) tuples), the total nominal cut
+        length and the length saved.
+    """
+    edge_hash = EdgeHash(tolerance, angle_tolerance)
+    part_edges = []
+    for part, outline in enumerate(outlines):
+        starts, ends = _edges(outline)
+        part_edges.append((starts, ends))
+        for start, end in zip(starts, ends):
+            edge_hash.add(part, start, end)
+
+    polylines = []
+    total_length = saved_length = 0.0
+    for part, (starts, ends) in enumerate(part_edges):
+        owners_before = range(part)
+        part_polylines = []
+        for start, end in zip(starts, ends):
+            length, intervals = _overlap_intervals(edge_hash, part, start, end, owners_before, min_length)
+            kept = _subtract(length, intervals) if intervals else [(0.0, length)]
+            total_length += length
+            saved_length += length - sum(t1 - t0 for t0, t1 in kept)
+            unit = (end - start) / length
+            for t0, t1 in kept:
+                a = tuple((start + unit * t0).tolist())
+                b = tuple((start + unit * t1).tolist())
+                if part_polylines and part_polylines[-1][-1] == a:
+                    part_polylines[-1].append(b)
+                else:
+                    part_polylines.append([a, b])
+        # Join the polyline that closes the ring with the one that opened it.
+        if len(part_polylines) > 1 and part_polylines[-1][-1] == part_polylines[0][0]:
+            part_polylines[0] = part_polylines.pop()[:-1] + part_polylines[0]
+        polylines.extend(part_polylines)
+    return polylines, total_length, saved_length
+
+
+def main():
+    """Reports and removes double cuts along shared edges of placed parts."""
+    parser = argparse.ArgumentParser(description="Detect common edges between placed parts.")
+    parser.add_argument("shapes_file")
+    parser.add_argument("positions_file")
+    parser.add_argument("--slices", help="slices file, needed to resolve a tagged positions file")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="distance tolerance in mm (default: 0.5)")
+    parser.add_argument("--angle-tolerance", type=float, default=0.5, help="angle tolerance in degrees (default: 0.5)")
+    parser.add_argument("--min-length", type=float, default=1.0, help="shortest shared stretch to merge (default: 1)")
+    parser.add_argument("-o", "--output", help="output file (default: <shapes>-cut-paths.txt)")
+    args = parser.parse_args()
+
+    try:
+        _, original_pieces_data = parse_problem_file(args.shapes_file)
+        tag_index = build_tag_index(parse_slices_file(args.slices)) if args.slices else None
+        unresolved = []
+        bins_data = parse_posiciones_file(args.positions_file, tag_index, unresolved)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    report_unresolved_tags(unresolved, args.positions_file)
+    if not bins_data:
+        print(f"Error: No data found in positions file '{args.positions_file}'")
+        sys.exit(1)
+
+    output_filename = args.output
+    if not output_filename:
+        base_name = os.path.splitext(os.path.basename(args.shapes_file))[0]
+        output_filename = f"{base_name.replace('-Shapes', '')}-cut-paths.txt"
+
+    start = time.perf_counter()
+    grand_total = grand_saved = 0.0
+    with open(output_filename, 'w') as f:
+        for bin_info in bins_data:
+            outlines = []
+            for piece_info in bin_info['placed_pieces']:
+                if piece_info['id'] not in original_pieces_data:
+                    continue
+                original_vertices, rotation_pivot = original_pieces_data[piece_info['id']]
+                outlines.append(outline_array(place_piece(original_vertices, rotation_pivot, piece_info)))
+            polylines, total, saved = merge_common_edges(outlines, args.tolerance, args.angle_tolerance,
+                                                         args.min_length)
+            grand_total += total
+            grand_saved += saved
+            print(f"  Bin {bin_info['number']}: cut length {total / 1000:.2f} m, "
+                  f"{saved / 1000:.2f} m shared ({100 * saved / total if total else 0:.1f}%)")
+            # Same block layout as posiciones.txt: a count line, then one polyline per line.
+            f.write(f"{len(polylines)}\n")
+            for polyline in polylines:
+                f.write(' '.join(f"{x:.3f},{y:.3f}" for x, y in polyline) + '\n')
+
+    print(f"Total cut length {grand_total / 1000:.2f} m, {grand_saved / 1000:.2f} m saved "
+          f"in {time.perf_counter() - start:.2f}s")
+    print(f"Cut paths saved to {output_filename}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+import sys
+import os
+import time
+import argparse
+
+import numpy as np
+import shapely
+from shapely.geometry import Polygon, box
+
+from visual_vector_slices import (parse_problem_file, parse_slices_file, build_tag_index, is_tagged_posiciones,
+                                  read_posiciones_lines, parse_posiciones_lines, report_unresolved_tags, place_piece)
+
+TOUCH = 0.01  # a part overlapping its neighbours by less than this (mm) where the nester put it may still move
+CONTACT = 1e-9  # overlaps shallower than this (mm) are the float noise of two parts in contact
+DECIMALS = 3  # parts are only moved to coordinates with this many decimals, so the moves are written exactly
+TOLERANCE = 0.05  # precision of a slide, in mm
+SAMPLES = 32      # outline points tested before the exact collision test
+ANCHOR_SPACING = 1.0  # free-area outlines are simplified to this tolerance (mm) for candidate positions
+
+
+class _Sheet:
+    """The parts of one bin, with a spatial index over their outlines.
+
+    Every part is kept as its outline in the local frame of its rotation
+    (bbox-min at the origin) plus the (x, y) of the posiciones file, so a
+    move is a translation of cached geometry. Collisions are tested with a
+    "probe": the outline grown by the spacing (less CONTACT), so parts may
+    end up touching, or exactly `spacing` apart, but never closer. Only the
+    test of whether a part already overlaps where the nester put it accepts
+    contacts up to TOUCH deep.
+
+    Placements of pieces missing from the Shapes file have no outline and
+    are not in the index, so a sheet holding one is left as it was nested.
+    """
+
+    def __init__(self, bin_info, shapes, bin_dimension):
+        self.width = bin_dimension.width
+        self.height = bin_dimension.height
+        self.shapes = shapes
+        self.parts = []       # dicts with the placement and its placed 'polygon' and 'probe'
+        self.unknown = []     # placements of pieces missing from the Shapes file, kept as they are
+        for piece_info in bin_info['placed_pieces']:
+            if shapes.get(piece_info['id'], piece_info['rotation']) is None:
+                self.unknown.append(dict(piece_info))
+            else:
+                self.parts.append(self._part(dict(piece_info)))
+        self._index()
+
+    def _part(self, piece_info):
+        local = self.shapes.get(piece_info['id'], piece_info['rotation'])
+        offset = np.array([piece_info['x'], piece_info['y']])
+        piece_info['polygon'] = shapely.transform(local['polygon'], lambda c: c + offset)
+        piece_info['probe'] = shapely.transform(local['probe'], lambda c: c + offset)
+        return piece_info
+
+    def _index(self):
+        self.tree = shapely.STRtree([part['polygon'] for part in self.parts])
+        self._free = None
+
+    def area(self):
+        return sum(self.shapes.get(p['id'], p['rotation'])['area'] for p in self.parts)
+
+    def collides(self, geometry, ignore=-1):
+        """Tells whether a probe geometry overlaps any part other than `ignore`."""
+        hits = self.tree.query(geometry, predicate='intersects')
+        return bool(np.any(hits != ignore))
+
+    def add(self, piece_info):
+        self.parts.append(self._part(piece_info))
+        self._index()
+
+    def remove(self, index):
+        piece_info = self.parts.pop(index)
+        self._index()
+        return piece_info
+
+    def move(self, index, dx, dy):
+        part = self.parts[index]
+        part['x'] = round(part['x'] + dx, DECIMALS)
+        part['y'] = round(part['y'] + dy, DECIMALS)
+        self.parts[index] = self._part(part)
+        self._index()
+
+    def slide(self, index, axis, step=5.0):
+        """Returns how far a part can slide towards the sheet edge at 0 along `axis` (0 = x, 1 = y).
+
+        Long stretches are cleared at once by testing the convex hull swept
+        by the probe; where that hull hits something the stretch is halved,
+        and stretches no longer than `step` are settled by testing the end
+        position and bisecting to TOLERANCE. Every distance tested lands the
+        part on the DECIMALS grid, so the slide ends on the last position
+        found free, exactly as it will be written.
+        """
+        part = self.parts[index]
+        limit = part['x'] if axis == 0 else part['y']
+        if limit <= TOLERANCE:
+            return 0.0
+        local = self.shapes.get(part['id'], part['rotation'])
+        offset = np.array([part['x'], part['y']])
+        probe = part['probe']
+        hull = local['hull'] + offset
+        direction = np.zeros(2)
+        direction[axis] = -1.0
+
+        def snap(t):
+            return limit - round(limit - t, DECIMALS)
+
+        def position_collides(t):
+            return self.collides(shapely.transform(probe, lambda c: c + direction * t), index)
+
+        def sweep_collides(t0, t1):
+            points = np.vstack([hull + direction * t0, hull + direction * t1])
+            return self.collides(shapely.multipoints(points).convex_hull, index)
+
+        def reach(t0, t1):
+            if t1 - t0 <= step:
+                if not position_collides(t1):
+                    return t1
+                while t1 - t0 > TOLERANCE:
+                    middle = snap((t0 + t1) / 2)
+                    if position_collides(middle):
+                        t1 = middle
+                    else:
+                        t0 = middle
+                return t0
+            if not sweep_collides(t0, t1):
+                return t1
+            middle = snap((t0 + t1) / 2)
+            reached = reach(t0, middle)
+            return reached if reached < middle else reach(middle, t1)
+
+        if self.collides(shapely.transform(local['touch'], lambda c: c + offset), index):
+            return 0.0  # already overlapping in the input; leave it where the nester put it
+        return reach(0.0, limit)
+
+    def settle(self, max_passes=5):
+        """Slides every part down, then left, bottom-left parts first, until nothing moves.
+
+        Returns:
+            The total distance travelled, in mm.
+        """
+        travelled = 0.0
+        if self.unknown:
+            return travelled
+        for _ in range(max_passes):
+            moved = 0.0
+            for index in sorted(range(len(self.parts)), key=lambda i: (self.parts[i]['y'], self.parts[i]['x'])):
+                for axis in (1, 0):
+                    distance = self.slide(index, axis)
+                    if distance > 0:
+                        self.move(index, -distance if axis == 0 else 0.0, -distance if axis == 1 else 0.0)
+                        moved += distance
+            travelled += moved
+            if moved < TOLERANCE:
+                break
+        return travelled
+
+    def free_regions(self):
+        """Returns the free regions of the sheet, largest first, as (prepared region, simplified vertices)."""
+        if self._free is None:
+            free_area = box(0, 0, self.width, self.height)
+            if self.parts:
+                free_area = free_area.difference(shapely.union_all([p['polygon'] for p in self.parts]))
+            regions = sorted(shapely.get_parts(free_area), key=lambda r: r.area, reverse=True)
+            shapely.prepare(regions)
+            self._free = [(region, shapely.get_coordinates(region.simplify(ANCHOR_SPACING, preserve_topology=False)))
+                          for region in regions]
+        return self._free
+
+    def find_spot(self, piece_id, rotations):
+        """Looks for a free position for a piece, trying each rotation in turn.
+
+        Candidate positions put a corner of the piece's bbox on a vertex of
+        a free region large enough to hold it. A sample of the piece's
+        outline points must fall inside that region before the exact
+        collision test is run, and candidates are tried bottom-left first.
+
+        Returns:
+            A placement dict, or None when the piece does not fit.
+        """
+        for rotation in rotations:
+            local = self.shapes.get(piece_id, rotation)
+            width, height = local['size']
+            if width > self.width or height > self.height:
+                continue
+            samples = local['samples']
+            anchors = []
+            for region, vertices in self.free_regions():
+                if region.area < local['area'] - TOUCH:
+                    break
+                min_x, min_y, max_x, max_y = region.bounds
+                if max_x - min_x < width - TOUCH or max_y - min_y < height - TOUCH:
+                    continue
+                corners = np.vstack([vertices, vertices - (width, 0), vertices - (0, height), vertices - (width, height)])
+                corners = np.round(corners, DECIMALS)
+                corners[:, 0] = np.clip(corners[:, 0], 0, _grid_floor(self.width - width))
+                corners[:, 1] = np.clip(corners[:, 1], 0, _grid_floor(self.height - height))
+                # Test the interior point first, then more and more of the outline.
+                for start, stop in ((0, 1), (1, 5), (5, None)):
+                    if not len(corners):
+                        break
+                    points = corners[:, None, :] + samples[None, start:stop, :]
+                    inside = shapely.intersects_xy(region, points[..., 0].ravel(), points[..., 1].ravel())
+                    corners = corners[inside.reshape(len(corners), -1).all(axis=1)]
+                anchors.append(corners)
+            if not anchors:
+                continue
+            anchors = np.vstack(anchors)
+            for x, y in anchors[np.lexsort((anchors[:, 0], anchors[:, 1]))]:
+                offset = np.array([x, y])
+                if not self.collides(shapely.transform(local['probe'], lambda c: c + offset)):
+                    return {'id': piece_id, 'rotation': rotation, 'x': float(x), 'y': float(y)}
+        return None
+
+
+class _Shapes:
+    """Caches the outline of every piece in the local frame of each rotation used."""
+
+    def __init__(self, original_pieces_data, spacing=0.0):
+        self.original_pieces_data = original_pieces_data
+        self.spacing = spacing
+        self._cache = {}
+
+    def get(self, piece_id, rotation):
+        key = (piece_id, rotation % 360)
+        if key not in self._cache:
+            self._cache[key] = self._local(piece_id, rotation)
+        return self._cache[key]
+
+    def _local(self, piece_id, rotation):
+        if piece_id not in self.original_pieces_data:
+            return None
+        original_vertices, rotation_pivot = self.original_pieces_data[piece_id]
+        polygon = Polygon(place_piece(original_vertices, rotation_pivot, {'rotation': rotation, 'x': 0.0, 'y': 0.0}))
+        if not polygon.is_valid:
+            polygon = polygon.buffer(0)
+        probe = polygon.buffer(self.spacing - CONTACT, join_style='mitre')
+        touch = polygon.buffer(self.spacing - TOUCH, join_style='mitre')
+        if polygon.is_empty or touch.is_empty:
+            return None
+        min_x, min_y, max_x, max_y = polygon.bounds
+        # An interior point and up to SAMPLES outline points of the probe, for
+        # cheap point-in-region tests before the exact one.
+        outline = shapely.get_coordinates(probe)
+        outline = outline[np.linspace(0, len(outline) - 1, min(SAMPLES, len(outline))).astype(int)]
+        samples = np.vstack([shapely.get_coordinates(probe.representative_point()), outline])
+        return {'polygon': polygon, 'probe': probe, 'touch': touch, 'area': polygon.area,
+                'size': (max_x - min_x, max_y - min_y), 'samples': samples,
+                'hull': shapely.get_coordinates(probe.convex_hull)}
+
+
+def compact(bins_data, bin_dimension, original_pieces_data, spacing=0.0, rotate=False):
+    """Compacts a nesting solution and empties the sheets it can.
+
+    Every sheet is first settled by sliding its parts down and left in
+    their current rotations. Then, emptiest sheet first, the parts of a
+    sheet are moved into gaps of the other sheets, fullest first; a sheet
+    is only given up when all its parts find a place, otherwise its moves
+    are undone. The sheets that received parts are settled again. Sheets
+    holding pieces missing from the Shapes file are left untouched.
+
+    Args:
+        bins_data: The bins returned by parse_posiciones_file.
+        bin_dimension: The BinDimension of the sheets.
+        original_pieces_data: The pieces dict returned by parse_problem_file.
+        spacing: Minimum distance to keep between the parts that move, in mm.
+        rotate: Also try quarter turns of a part when moving it to another sheet.
+
+    Returns:
+        The compacted bins, renumbered, in the posiciones structure.
+    """
+    shapes = _Shapes(original_pieces_data, spacing)
+    sheets = [_Sheet(bin_info, shapes, bin_dimension) for bin_info in bins_data]
+    for sheet in sheets:
+        sheet.settle()
+
+    sheet_area = bin_dimension.width * bin_dimension.height
+    emptied = set()
+    for source in sorted(sheets, key=lambda s: s.area()):
+        if source.unknown or not source.parts or len(emptied) + 1 == len(sheets):
+            continue
+        room = sum(sheet_area - target.area() for target in sheets
+                   if target is not source and id(target) not in emptied and not target.unknown)
+        if source.area() > room:
+            continue
+        moves = []
+        received = set()
+        for part in sorted(source.parts, key=lambda p: -shapes.get(p['id'], p['rotation'])['area']):
+            area = shapes.get(part['id'], part['rotation'])['area']
+            rotations = [part['rotation'] + turn for turn in ((0, 90, 180, 270) if rotate else (0,))]
+            for target in sorted(sheets, key=lambda s: -s.area()):
+                if target is source or id(target) in emptied or target.unknown or sheet_area - target.area() < area:
+                    continue
+                spot = target.find_spot(part['id'], rotations)
+                if spot is not None:
+                    target.add(spot)
+                    moves.append(target)
+                    received.add(id(target))
+                    break
+            else:
+                break
+        if len(moves) == len(source.parts):
+            emptied.add(id(source))
+            for target in sheets:
+                if id(target) in received:
+                    target.settle()
+        else:
+            for target in reversed(moves):
+                target.remove(len(target.parts) - 1)
+
+    compacted = []
+    for sheet in sheets:
+        if id(sheet) in emptied:
+            continue
+        placed_pieces = [{key: part[key] for key in ('id', 'rotation', 'x', 'y')} for part in sheet.parts]
+        compacted.append({'number': len(compacted) + 1, 'placed_pieces': placed_pieces + sheet.unknown})
+    return compacted
+
+
+def _grid_floor(value):
+    return np.floor(value * 10 ** DECIMALS) / 10 ** DECIMALS
+
+
+def _number(value):
+    # Six decimals give back both the moved coordinates and the ones read from the nester unchanged.
+    text = f"{value:.6f}".rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+
+def write_posiciones_file(file_path, bins_data, labels=(), tagged=False):
+    """Writes bins in the posiciones format, naming pieces by tag when `tagged`."""
+    with open(file_path, 'w') as f:
+        for bin_info in bins_data:
+            f.write(f"{len(bin_info['placed_pieces'])}\n")
+            for piece_info in bin_info['placed_pieces']:
+                piece_id = piece_info['id']
+                token = labels[piece_id - 1] if tagged and 0 <= piece_id - 1 < len(labels) else str(piece_id)
+                f.write(f"{token} {piece_info['rotation'] % 360:g} {_number(piece_info['x'])} "
+                        f"{_number(piece_info['y'])}\n")
+
+
+def main():
+    """Compacts an existing nesting solution and writes the improved posiciones file."""
+    parser = argparse.ArgumentParser(description="Slide parts down and left and empty the last sheets of a nest.")
+    parser.add_argument("shapes_file")
+    parser.add_argument("positions_file")
+    parser.add_argument("--slices", help="slices file, needed for a tagged positions file")
+    parser.add_argument("--spacing", type=float, default=0.0,
+                        help="minimum distance kept between parts that move, in mm (default: 0)")
+    parser.add_argument("--rotate", action="store_true",
+                        help="allow quarter turns of the parts moved to another sheet")
+    parser.add_argument("-o", "--output", help="output posiciones file (default: <base>-posiciones-compacted.txt)")
+    args = parser.parse_args()
+
+    try:
+        bin_dimension, original_pieces_data = parse_problem_file(args.shapes_file)
+        labels = parse_slices_file(args.slices) if args.slices else []
+        lines = read_posiciones_lines(args.positions_file)
+        tagged = is_tagged_posiciones(lines)
+        unresolved = []
+        bins_data = parse_posiciones_lines(lines, build_tag_index(labels) if labels else None, unresolved,
+                                           args.positions_file)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    report_unresolved_tags(unresolved, args.positions_file)
+    if not bins_data:
+        print(f"Error: No data found in positions file '{args.positions_file}'")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    compacted = compact(bins_data, bin_dimension, original_pieces_data, args.spacing, args.rotate)
+    elapsed = time.perf_counter() - start
+
+    base_name = os.path.splitext(os.path.basename(args.shapes_file))[0]
+    if base_name.endswith('-Shapes'):
+        base_name = base_name[:-len('-Shapes')]
+    output_filename = args.output or f"{base_name}-posiciones-compacted.txt"
+    write_posiciones_file(output_filename, compacted, labels, tagged)
+    parts = sum(len(bin_info['placed_pieces']) for bin_info in bins_data)
+    print(f"{parts} parts: {len(bins_data)} sheets -> {len(compacted)} sheets "
+          f"({len(bins_data) - len(compacted)} saved) in {elapsed:.2f}s")
+    print(f"Compacted positions saved to {output_filename}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import sys
+import os
+import time
+import hashlib
+import argparse
+
+import numpy as np
+
+from visual_vector_slices import parse_problem_file, parse_slices_file
+
+
+def canonical_outline(vertices, quantum=0.01):
+    """Returns a translation-free, integer form of an outline.
+
+    The outline is moved so its bbox-min is the origin and snapped to a grid
+    of `quantum` mm. Repeated points and the closing point are dropped, the
+    ring is oriented counter-clockwise and starts at its lexicographically
+    smallest vertex, so two copies of a piece give the same array whatever
+    their position, winding or starting vertex.
+    """
+    points = np.asarray(vertices, dtype=float).reshape(-1, 2)
+    # Rounding away the float noise of the subtraction first makes exact
+    # copies land on the same side of a grid line, even on a tie.
+    points = np.round(points - points.min(axis=0), 6)
+    points = np.floor(points / quantum + 0.5).astype(np.int64)
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = np.any(np.diff(points, axis=0) != 0, axis=1)
+    points = points[keep]
+    if len(points) > 1 and np.array_equal(points[0], points[-1]):
+        points = points[:-1]
+    if len(points) < 3:
+        return points
+    x, y = points[:, 0], points[:, 1]
+    if (x * np.roll(y, -1) - np.roll(x, -1) * y).sum() < 0:
+        points = points[::-1]
+    first = np.lexsort((points[:, 1], points[:, 0]))[0]
+    return np.roll(points, -first, axis=0)
+
+
+def shape_key(vertices, quantum=0.01):
+    """Hashes the canonical outline of a piece."""
+    return hashlib.blake2b(canonical_outline(vertices, quantum).tobytes(), digest_size=16).digest()
+
+
+def group_pieces(original_pieces_data, quantum=0.01, mirrored=True):
+    """Groups pieces whose outlines are identical up to translation.
+
+    Args:
+        original_pieces_data: The pieces dict returned by parse_problem_file.
+        quantum: Grid in mm two outlines must agree on.
+        mirrored: Also group a piece with the mirror image (x -> -x) of another.
+
+    Returns:
+        A dict mapping every piece id to (representative_id, is_mirrored); the
+        representative is the lowest id of the group. A mirrored piece is the
+        representative reflected about the vertical axis of its bbox.
+    """
+    representatives = {}
+    piece_groups = {}
+    for piece_id in sorted(original_pieces_data):
+        vertices, _ = original_pieces_data[piece_id]
+        key = shape_key(vertices, quantum)
+        if key in representatives:
+            piece_groups[piece_id] = (representatives[key], False)
+            continue
+        if mirrored:
+            mirror_key = shape_key([(-x, y) for x, y in vertices], quantum)
+            if mirror_key in representatives:
+                piece_groups[piece_id] = (representatives[mirror_key], True)
+                continue
+        representatives[key] = piece_id
+        piece_groups[piece_id] = (piece_id, False)
+    return piece_groups
+
+
+def unique_shapes(piece_groups):
+    """Returns the representatives' ids, i.e. the shapes that really have to be processed."""
+    return sorted({representative for representative, _ in piece_groups.values()})
+
+
+def main():
+    """Reports how many distinct outlines a project has."""
+    parser = argparse.ArgumentParser(description="Find pieces with identical outlines in a Shapes file.")
+    parser.add_argument("shapes_file")
+    parser.add_argument("--slices", help="slices file, used to print tags instead of piece ids")
+    parser.add_argument("--quantum", type=float, default=0.01, help="grid in mm outlines must agree on (default: 0.01)")
+    parser.add_argument("--no-mirror", action="store_true", help="do not group mirror images")
+    args = parser.parse_args()
+
+    try:
+        _, original_pieces_data = parse_problem_file(args.shapes_file)
+        labels = parse_slices_file(args.slices) if args.slices else []
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    piece_groups = group_pieces(original_pieces_data, args.quantum, not args.no_mirror)
+    elapsed = time.perf_counter() - start
+
+    def name(piece_id):
+        return labels[piece_id - 1] if 0 <= piece_id - 1 < len(labels) else str(piece_id)
+
+    members = {}
+    for piece_id, (representative, is_mirrored) in sorted(piece_groups.items()):
+        if piece_id != representative:
+            members.setdefault(representative, []).append(name(piece_id) + (" (mirrored)" if is_mirrored else ""))
+    for representative, copies in sorted(members.items()):
+        print(f"  {name(representative)}: {', '.join(copies)}")
+    print(f"{os.path.basename(args.shapes_file)}: {len(piece_groups)} pieces, "
+          f"{len(unique_shapes(piece_groups))} unique shapes ({elapsed * 1000:.0f} ms)")
+
+if __name__ == "__main__":
+    main()
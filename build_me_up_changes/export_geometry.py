@@ -0,0 +1,185 @@
+import sys
+import os
+import time
+import struct
+import zipfile
+import argparse
+
+import numpy as np
+
+from visual_vector_slices import (parse_problem_file, parse_slices_file, build_tag_index, parse_posiciones_file,
+                                  report_unresolved_tags, piece_frame, placement_transform)
+
+
+def placed_geometry(bins_data, original_pieces_data, labels=()):
+    """Places every piece of a solution and returns the result as columns.
+
+    The outlines of all placements share one coordinate buffer; placement i
+    owns rows offsets[i]:offsets[i + 1]. Placements use the same transform
+    as place_piece (rotation about the pivot, then bbox-min to (x, y)), so
+    consumers never have to redo it.
+
+    Returns:
+        A dict of numpy arrays: 'coords' (n_vertices, 2), 'offsets'
+        (n_placements + 1), and per placement 'bin', 'piece_id', 'tag',
+        'angle', 'x', 'y', 'bbox' (min_x, min_y, max_x, max_y) and 'area'.
+    """
+    frames = {}
+    outlines = []
+    columns = {'bin': [], 'piece_id': [], 'tag': [], 'angle': [], 'x': [], 'y': [], 'area': []}
+    for bin_info in bins_data:
+        for piece_info in bin_info['placed_pieces']:
+            piece_id = piece_info['id']
+            if piece_id not in original_pieces_data:
+                continue
+            if piece_id not in frames:
+                local_vertices, hull = piece_frame(*original_pieces_data[piece_id])
+                local = np.asarray(local_vertices, dtype=float).reshape(-1, 2)
+                x, y = local[:, 0], local[:, 1]
+                frames[piece_id] = (local, hull, abs(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) / 2)
+            local, hull, area = frames[piece_id]
+            cos_theta, sin_theta, tx, ty = placement_transform(hull, piece_info)
+            outlines.append(local @ np.array([[cos_theta, sin_theta], [-sin_theta, cos_theta]]) + (tx, ty))
+            columns['bin'].append(bin_info['number'])
+            columns['piece_id'].append(piece_id)
+            columns['tag'].append(labels[piece_id - 1] if 0 <= piece_id - 1 < len(labels) else str(piece_id))
+            columns['angle'].append(piece_info['rotation'])
+            columns['x'].append(piece_info['x'])
+            columns['y'].append(piece_info['y'])
+            columns['area'].append(area)
+
+    lengths = np.array([len(outline) for outline in outlines], dtype=np.int64)
+    offsets = np.zeros(len(outlines) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    coords = np.vstack(outlines) if outlines else np.zeros((0, 2))
+    starts = offsets[:-1][lengths > 0]
+    bbox = np.zeros((len(outlines), 4))
+    if len(starts):
+        bbox[lengths > 0] = np.hstack([np.minimum.reduceat(coords, starts), np.maximum.reduceat(coords, starts)])
+    return {
+        'coords': coords,
+        'offsets': offsets,
+        'bin': np.array(columns['bin'], dtype=np.int32),
+        'piece_id': np.array(columns['piece_id'], dtype=np.int32),
+        'tag': np.array(columns['tag'], dtype=str),
+        'angle': np.array(columns['angle'], dtype=float),
+        'x': np.array(columns['x'], dtype=float),
+        'y': np.array(columns['y'], dtype=float),
+        'bbox': bbox,
+        'area': np.array(columns['area'], dtype=float),
+    }
+
+
+def write_npz(file_name, geometry):
+    """Writes the columns to an uncompressed .npz, so load_npz can map them."""
+    np.savez(file_name, **geometry)
+
+
+def load_npz(file_name):
+    """Memory-maps the columns of an uncompressed .npz without reading them.
+
+    np.load ignores mmap_mode for .npz archives. Since the members are
+    stored, each one is a plain .npy file at a known offset of the archive,
+    so its header is parsed and the data is mapped with np.memmap.
+
+    Returns:
+        A dict of read-only arrays, keyed like placed_geometry's result.
+    """
+    arrays = {}
+    with zipfile.ZipFile(file_name) as archive, open(file_name, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"'{file_name}' is compressed; write it with write_npz to map it")
+            # Local file header: 30 fixed bytes, then the name and an extra field of their own lengths.
+            f.seek(info.header_offset)
+            name_length, extra_length = struct.unpack('<HH', f.read(30)[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-len('.npy')] if info.filename.endswith('.npy') else info.filename
+            if not np.prod(shape):
+                arrays[name] = np.zeros(shape, dtype=dtype)
+                continue
+            arrays[name] = np.memmap(file_name, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                     order='F' if fortran_order else 'C')
+    return arrays
+
+
+def write_arrow(file_name, geometry):
+    """Writes the columns as an Arrow IPC file; pyarrow is only needed for this format.
+
+    Each row is a placement and its outline is a list of (x, y) pairs built
+    on the shared coordinate buffer, so pyarrow.memory_map plus
+    pyarrow.ipc.open_file reads it back without copying.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise RuntimeError("Arrow output needs pyarrow (pip install pyarrow)")
+    points = pa.FixedSizeListArray.from_arrays(pa.array(geometry['coords'].ravel()), 2)
+    bbox = geometry['bbox']
+    table = pa.table({
+        'bin': geometry['bin'],
+        'piece_id': geometry['piece_id'],
+        'tag': pa.array(geometry['tag'].tolist(), type=pa.string()),
+        'angle': geometry['angle'],
+        'x': geometry['x'],
+        'y': geometry['y'],
+        'min_x': bbox[:, 0],
+        'min_y': bbox[:, 1],
+        'max_x': bbox[:, 2],
+        'max_y': bbox[:, 3],
+        'area': geometry['area'],
+        'outline': pa.LargeListArray.from_arrays(pa.array(geometry['offsets']), points),
+    })
+    with pa.OSFile(file_name, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def main():
+    """Exports the placed geometry of a nesting solution for other programs."""
+    parser = argparse.ArgumentParser(description="Write the final placed outlines of a project in a columnar format.")
+    parser.add_argument("shapes_file")
+    parser.add_argument("positions_file")
+    parser.add_argument("--slices", help="slices file, used for tags and to resolve a tagged positions file")
+    parser.add_argument("--arrow", action="store_true", help="write an Arrow IPC file instead of an .npz")
+    parser.add_argument("-o", "--output", help="output file (default: <shapes>-geometry.npz or .arrow)")
+    args = parser.parse_args()
+
+    try:
+        _, original_pieces_data = parse_problem_file(args.shapes_file)
+        labels = parse_slices_file(args.slices) if args.slices else []
+        unresolved = []
+        bins_data = parse_posiciones_file(args.positions_file, build_tag_index(labels) if labels else None, unresolved)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    report_unresolved_tags(unresolved, args.positions_file)
+    if not bins_data:
+        print(f"Error: No data found in positions file '{args.positions_file}'")
+        sys.exit(1)
+
+    output_filename = args.output
+    if not output_filename:
+        base_name = os.path.splitext(os.path.basename(args.shapes_file))[0]
+        output_filename = f"{base_name.replace('-Shapes', '')}-geometry.{'arrow' if args.arrow else 'npz'}"
+
+    start = time.perf_counter()
+    geometry = placed_geometry(bins_data, original_pieces_data, labels)
+    if args.arrow:
+        try:
+            write_arrow(output_filename, geometry)
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    else:
+        write_npz(output_filename, geometry)
+    elapsed = time.perf_counter() - start
+    print(f"{len(geometry['bin'])} placements, {len(geometry['coords'])} vertices exported in {elapsed:.2f}s")
+    print(f"Geometry saved to {output_filename}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import sys
+import csv
+import time
+import argparse
+
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+from visual_vector_slices import (parse_problem_file, parse_slices_file, build_tag_index, parse_posiciones_file,
+                                  report_unresolved_tags, place_piece)
+
+
+class SheetIndex:
+    """Spatial index over the placed parts of one bin.
+
+    The placed polygons are prepared and stored in an STRtree, so a query
+    is a bounding-box lookup followed by an exact, prepared containment test
+    on the few candidates. Parts nested inside another part's outline both
+    contain the point; the smallest one is reported first.
+    """
+
+    def __init__(self, bin_info, original_pieces_data, labels=()):
+        self.number = bin_info['number']
+        self.placements = []
+        polygons = []
+        for piece_info in bin_info['placed_pieces']:
+            piece_id = piece_info['id']
+            if piece_id not in original_pieces_data:
+                continue
+            original_vertices, rotation_pivot = original_pieces_data[piece_id]
+            polygon = Polygon(place_piece(original_vertices, rotation_pivot, piece_info))
+            if not polygon.is_valid:
+                polygon = polygon.buffer(0)
+            polygons.append(polygon)
+            tag = labels[piece_id - 1] if 0 <= piece_id - 1 < len(labels) else str(piece_id)
+            self.placements.append(dict(piece_info, tag=tag))
+        self.polygons = np.array(polygons, dtype=object)
+        self.areas = shapely.area(self.polygons)
+        shapely.prepare(self.polygons)
+        self.tree = shapely.STRtree(self.polygons)
+
+    def query_many(self, xs, ys, tolerance=0.0):
+        """Finds the part under each of many points at once.
+
+        Args:
+            xs, ys: Sheet coordinates of the points, in mm.
+            tolerance: Points outside every part are matched to the nearest
+                part within this distance (0 disables it).
+
+        Returns:
+            An array with, per point, the index into `placements` of the
+            part found, or -1, and an array with the distance to it (0 for a
+            point inside the part).
+        """
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        hits = np.full(len(xs), -1)
+        distances = np.full(len(xs), np.inf)
+        if not len(self.polygons) or not len(xs):
+            return hits, distances
+        points = shapely.points(xs, ys)
+        point_idx, part_idx = self.tree.query(points)
+        inside = shapely.intersects_xy(self.polygons[part_idx], xs[point_idx], ys[point_idx])
+        point_idx, part_idx = point_idx[inside], part_idx[inside]
+        # Sort each point's candidates by area and keep the first, so the
+        # smallest containing part wins (the lowest index on a tie).
+        order = np.lexsort((part_idx, self.areas[part_idx], point_idx))
+        winners, first = np.unique(point_idx[order], return_index=True)
+        hits[winners] = part_idx[order][first]
+        distances[point_idx] = 0.0
+        missed = np.flatnonzero(hits < 0)
+        if tolerance > 0 and len(missed):
+            (near_point, near_part), near_distance = self.tree.query_nearest(
+                points[missed], max_distance=tolerance, return_distance=True, all_matches=False)
+            hits[missed[near_point]] = near_part
+            distances[missed[near_point]] = near_distance
+        return hits, distances
+
+    def query(self, x, y, tolerance=0.0):
+        """Returns the placement dict of the part at (x, y), or None."""
+        hits, _ = self.query_many([x], [y], tolerance)
+        return self.placements[hits[0]] if hits[0] >= 0 else None
+
+
+def build_hit_index(bins_data, original_pieces_data, labels=()):
+    """Builds a SheetIndex for every bin, keyed by bin number."""
+    return {bin_info['number']: SheetIndex(bin_info, original_pieces_data, labels) for bin_info in bins_data}
+
+
+def hit_test(index, queries, tolerance=0.0):
+    """Answers a batch of (bin, x, y) queries.
+
+    Queries are grouped per bin so each sheet is searched with one
+    vectorized call.
+
+    Returns:
+        One result per query, in order: the placement dict (with its 'tag')
+        of the part found, or None.
+    """
+    results = [None] * len(queries)
+    per_bin = {}
+    for position, (bin_number, x, y) in enumerate(queries):
+        per_bin.setdefault(bin_number, []).append((position, x, y))
+    for bin_number, items in per_bin.items():
+        sheet = index.get(bin_number)
+        if sheet is None:
+            continue
+        positions, xs, ys = zip(*items)
+        hits, _ = sheet.query_many(xs, ys, tolerance)
+        for position, hit in zip(positions, hits):
+            if hit >= 0:
+                results[position] = sheet.placements[hit]
+    return results
+
+
+def read_queries(lines):
+    """Parses 'bin x y' lines (spaces or commas); blank lines and '#' comments are skipped."""
+    queries = []
+    for line_number, line in enumerate(lines, start=1):
+        line = line.split('#')[0].replace(',', ' ').split()
+        if not line:
+            continue
+        try:
+            queries.append((int(line[0]), float(line[1]), float(line[2])))
+        except (ValueError, IndexError):
+            raise ValueError(f"line {line_number}: expected 'bin x y', got '{' '.join(line)}'")
+    return queries
+
+
+def main():
+    """Identifies the parts at given positions of a nesting solution."""
+    parser = argparse.ArgumentParser(description="Find which part is at a spot of a sheet.")
+    parser.add_argument("shapes_file")
+    parser.add_argument("positions_file")
+    parser.add_argument("--slices", help="slices file, used for tags and to resolve a tagged positions file")
+    parser.add_argument("--at", nargs=3, action="append", metavar=("BIN", "X", "Y"), default=[],
+                        help="query one position; can be repeated")
+    parser.add_argument("--queries", help="file with one 'bin x y' query per line ('-' for stdin)")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="match points within this distance (mm) of a part (default: 0)")
+    parser.add_argument("-o", "--output", help="write the results as CSV instead of printing them")
+    args = parser.parse_args()
+
+    try:
+        _, original_pieces_data = parse_problem_file(args.shapes_file)
+        labels = parse_slices_file(args.slices) if args.slices else []
+        unresolved = []
+        bins_data = parse_posiciones_file(args.positions_file, build_tag_index(labels) if labels else None, unresolved)
+        queries = read_queries(' '.join(q) for q in args.at)
+        if args.queries == '-':
+            queries += read_queries(sys.stdin)
+        elif args.queries:
+            with open(args.queries) as f:
+                queries += read_queries(f)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    report_unresolved_tags(unresolved, args.positions_file)
+    if not bins_data:
+        print(f"Error: No data found in positions file '{args.positions_file}'")
+        sys.exit(1)
+    if not queries:
+        print("Error: No queries given (use --at or --queries)")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    index = build_hit_index(bins_data, original_pieces_data, labels)
+    built = time.perf_counter()
+    results = hit_test(index, queries, args.tolerance)
+    elapsed = time.perf_counter() - built
+
+    rows = [(bin_number, x, y) + ((p['id'], p['tag'], p['rotation'], p['x'], p['y']) if p else ('', '', '', '', ''))
+            for (bin_number, x, y), p in zip(queries, results)]
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['bin', 'x', 'y', 'piece_id', 'tag', 'rotation', 'place_x', 'place_y'])
+            writer.writerows(rows)
+    else:
+        for bin_number, x, y, piece_id, tag, rotation, place_x, place_y in rows:
+            found = f"piece {piece_id} ({tag}), rotation {rotation:g}, placed at ({place_x:g}, {place_y:g})" \
+                if piece_id != '' else "no part"
+            print(f"  Bin {bin_number} ({x:g}, {y:g}): {found}")
+    found = sum(result is not None for result in results)
+    print(f"{found} of {len(queries)} positions matched; index built in {(built - start) * 1000:.0f} ms, "
+          f"{elapsed / len(queries) * 1e6:.1f} µs per query")
+    if args.output:
+        print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import sys
+import os
+import csv
+import time
+import argparse
+
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+from visual_vector_slices import (parse_problem_file, parse_slices_file, build_tag_index, parse_posiciones_file,
+                                  report_unresolved_tags, piece_frame, placement_transform)
+
+TOLERANCE = 0.001  # clearance and sheet-edge shortfalls below this (mm) are ignored
+
+
+def offset_outlines(original_pieces_data, radius, quad_segs=8):
+    """Offsets every piece outward by the tool radius, in one vectorized buffer call.
+
+    The offset is computed once per piece, in the pivot-relative frame of
+    piece_frame, so every placement of the piece only has to rotate and
+    translate the result.
+
+    Args:
+        original_pieces_data: The pieces dict returned by parse_problem_file.
+        radius: Tool radius (half the kerf), in mm.
+        quad_segs: Segments per quarter circle of the rounded corners.
+
+    Returns:
+        A dict mapping each piece id to (hull, path, outline): the hull used
+        by placement_transform, the offset toolpath as a closed (n, 2) array
+        and the nominal outline as a polygon, all in the local frame.
+    """
+    piece_ids = sorted(original_pieces_data)
+    hulls = []
+    outlines = []
+    for piece_id in piece_ids:
+        local_vertices, hull = piece_frame(*original_pieces_data[piece_id])
+        outline = Polygon(local_vertices)
+        hulls.append(hull)
+        outlines.append(outline if outline.is_valid else outline.buffer(0))
+    offsets = shapely.buffer(np.array(outlines, dtype=object), radius, quad_segs=quad_segs)
+    paths = {}
+    for piece_id, hull, outline, offset in zip(piece_ids, hulls, outlines, offsets):
+        if offset.is_empty:
+            continue
+        # Only the outer ring is cut; holes of the offset are bays the tool cannot enter.
+        shell = max(shapely.get_parts(offset), key=lambda p: p.area).exterior
+        paths[piece_id] = (hull, shapely.get_coordinates(shell), outline)
+    return paths
+
+
+def place_paths(bin_info, paths):
+    """Moves the offset paths and nominal outlines of a bin's pieces onto the sheet.
+
+    Returns:
+        The placements kept (pieces without a path are skipped), their
+        toolpaths as arrays and their nominal outlines as polygons.
+    """
+    placements = []
+    placed_paths = []
+    placed_outlines = []
+    for piece_info in bin_info['placed_pieces']:
+        if piece_info['id'] not in paths:
+            continue
+        hull, path, outline = paths[piece_info['id']]
+        cos_theta, sin_theta, tx, ty = placement_transform(hull, piece_info)
+        matrix = np.array([[cos_theta, sin_theta], [-sin_theta, cos_theta]])
+        translation = np.array([tx, ty])
+        placements.append(piece_info)
+        placed_paths.append(path @ matrix + translation)
+        placed_outlines.append(shapely.transform(outline, lambda c: c @ matrix + translation))
+    return placements, placed_paths, placed_outlines
+
+
+def check_clearances(placed_paths, placed_outlines, bin_dimension, radius):
+    """Finds the toolpaths of a bin that cut into a neighbour or leave the sheet.
+
+    Two toolpaths whose offset areas intersect are found through an
+    STRtree; the pair is a violation when the nominal parts are less than
+    two tool radii apart, i.e. the kerf of one eats into the other.
+
+    Returns:
+        A list of (kind, i, j, amount) tuples: ('clearance', i, j, shortfall)
+        for a pair of parts and ('sheet', i, -1, overhang) for a toolpath
+        beyond the sheet edge, amounts in mm.
+    """
+    violations = []
+    if not placed_paths:
+        return violations
+    ring_index = np.repeat(np.arange(len(placed_paths)), [len(path) for path in placed_paths])
+    areas = shapely.polygons(shapely.linearrings(np.vstack(placed_paths), indices=ring_index))
+    outlines = np.array(placed_outlines, dtype=object)
+    first, second = shapely.STRtree(areas).query(areas, predicate='intersects')
+    pairs = first < second
+    first, second = first[pairs], second[pairs]
+    shortfall = 2 * radius - shapely.distance(outlines[first], outlines[second])
+    for i, j, amount in zip(first, second, shortfall):
+        if amount > TOLERANCE:
+            violations.append(('clearance', int(i), int(j), float(amount)))
+    bounds = shapely.bounds(areas)
+    overhang = np.max([-bounds[:, 0], -bounds[:, 1], bounds[:, 2] - bin_dimension.width,
+                       bounds[:, 3] - bin_dimension.height], axis=0)
+    for i in np.flatnonzero(overhang > TOLERANCE):
+        violations.append(('sheet', int(i), -1, float(overhang[i])))
+    return violations
+
+
+def main():
+    """Generates kerf-offset toolpaths for a nesting solution and verifies their clearances."""
+    parser = argparse.ArgumentParser(description="Offset the placed parts by the tool radius and check the result.")
+    parser.add_argument("shapes_file")
+    parser.add_argument("positions_file")
+    parser.add_argument("--radius", type=float, required=True, help="tool radius (half the kerf width), in mm")
+    parser.add_argument("--slices", help="slices file, used for tags and to resolve a tagged positions file")
+    parser.add_argument("--quad-segs", type=int, default=8,
+                        help="segments per quarter circle on rounded corners (default: 8)")
+    parser.add_argument("--report", help="write the violations to this CSV file")
+    parser.add_argument("-o", "--output", help="output file (default: <shapes>-kerf-paths.txt)")
+    args = parser.parse_args()
+
+    if args.radius <= 0:
+        print("Error: The tool radius must be positive")
+        sys.exit(1)
+    try:
+        bin_dimension, original_pieces_data = parse_problem_file(args.shapes_file)
+        labels = parse_slices_file(args.slices) if args.slices else []
+        unresolved = []
+        bins_data = parse_posiciones_file(args.positions_file, build_tag_index(labels) if labels else None, unresolved)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    report_unresolved_tags(unresolved, args.positions_file)
+    if not bins_data:
+        print(f"Error: No data found in positions file '{args.positions_file}'")
+        sys.exit(1)
+
+    output_filename = args.output
+    if not output_filename:
+        base_name = os.path.splitext(os.path.basename(args.shapes_file))[0]
+        output_filename = f"{base_name.replace('-Shapes', '')}-kerf-paths.txt"
+
+    def name(piece_id):
+        return labels[piece_id - 1] if 0 <= piece_id - 1 < len(labels) else str(piece_id)
+
+    start = time.perf_counter()
+    paths = offset_outlines(original_pieces_data, args.radius, args.quad_segs)
+    rows = []
+    with open(output_filename, 'w') as f:
+        for bin_info in bins_data:
+            placements, placed_paths, placed_outlines = place_paths(bin_info, paths)
+            violations = check_clearances(placed_paths, placed_outlines, bin_dimension, args.radius)
+            clearance = [amount for kind, _, _, amount in violations if kind == 'clearance']
+            outside = sum(kind == 'sheet' for kind, _, _, _ in violations)
+            worst = f" (worst {max(clearance):.3f} mm short)" if clearance else ""
+            print(f"  Bin {bin_info['number']}: {len(placements)} toolpaths, {len(clearance)} clearance violations"
+                  f"{worst}, {outside} off the sheet")
+            for kind, i, j, amount in violations:
+                rows.append([bin_info['number'], kind, name(placements[i]['id']),
+                             name(placements[j]['id']) if j >= 0 else '', f"{amount:.3f}"])
+            # Same block layout as the cut-paths file: a count line, then one closed path per line.
+            f.write(f"{len(placed_paths)}\n")
+            for path in placed_paths:
+                f.write(' '.join(f"{x:.3f},{y:.3f}" for x, y in path) + '\n')
+    elapsed = time.perf_counter() - start
+
+    if args.report:
+        with open(args.report, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['bin', 'kind', 'part', 'other_part', 'amount_mm'])
+            writer.writerows(rows)
+    print(f"{len(rows)} violations for a {args.radius:g} mm tool radius in {elapsed:.2f}s")
+    print(f"Toolpaths saved to {output_filename}")
+    if args.report:
+        print(f"Violations saved to {args.report}")
+
+if __name__ == "__main__":
+    main()
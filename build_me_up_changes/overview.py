@@ -0,0 +1,222 @@
+import sys
+import os
+import math
+import time
+import argparse
+
+import shapely
+from shapely.geometry import Polygon
+from shapely.ops import polylabel
+from reportlab.pdfgen import canvas
+from reportlab.lib import colors, pagesizes
+
+from romans_font import Romans
+from visual_vector_slices import (parse_problem_file, parse_slices_file, build_tag_index, parse_posiciones_file,
+                                  report_unresolved_tags, place_piece, draw_label, label_strokes)
+
+MARGIN = 20        # page margin in points
+GAP = 10           # space between two sheets in points
+GLYPH_HEIGHT = 21  # cap height of the Romans font at scale 1
+
+
+def grid_shape(count, page_width, page_height, bin_width, bin_height):
+    """Returns (columns, rows, scale) maximising the sheet size for `count` sheets on the page."""
+    best = (1, count, 0.0)
+    for columns in range(1, count + 1):
+        rows = math.ceil(count / columns)
+        scale = min((page_width - 2 * MARGIN - (columns - 1) * GAP) / (columns * bin_width),
+                    (page_height - 2 * MARGIN - (rows - 1) * GAP) / (rows * bin_height))
+        if scale > best[2]:
+            best = (columns, rows, scale)
+    return best
+
+
+def overview_layout(bins_data, bin_dimension, original_pieces_data, labels, page_size, dpi=150, min_label=4.0):
+    """Lays out every bin of a project on one page at device resolution.
+
+    Outlines are simplified once per distinct piece, in its own frame, with a
+    tolerance of one device pixel and only then placed; pieces smaller than a
+    pixel are dropped. Labels whose glyphs would be shorter than `min_label`
+    points are skipped before any label anchor is searched for.
+
+    Args:
+        page_size: (width, height) of the page in points.
+        dpi: Target device resolution.
+        min_label: Smallest legible label height, in points.
+
+    Returns:
+        The drawing scale (points per mm) and a list with one
+        (origin_x, origin_y, pieces) cell per bin, where pieces holds dicts
+        with the placed 'vertices' and, for legible labels, 'label',
+        'label_point' and 'label_size'.
+    """
+    page_width, page_height = page_size
+    columns, rows, scale = grid_shape(len(bins_data), page_width, page_height,
+                                      bin_dimension.width, bin_dimension.height)
+    pixel = 72.0 / dpi / scale  # one device pixel, in sheet millimetres
+    simplified = {}
+    cells = []
+    for index, bin_info in enumerate(bins_data):
+        column, row = index % columns, index // columns
+        origin_x = MARGIN + column * (bin_dimension.width * scale + GAP)
+        origin_y = page_height - MARGIN - (row + 1) * bin_dimension.height * scale - row * GAP
+        pieces = []
+        for piece_info in bin_info['placed_pieces']:
+            piece_id = piece_info['id']
+            if piece_id not in original_pieces_data:
+                continue
+            if piece_id not in simplified:
+                original_vertices, rotation_pivot = original_pieces_data[piece_id]
+                outline = Polygon(original_vertices).exterior.simplify(pixel)
+                min_x, min_y, max_x, max_y = outline.bounds
+                visible = max(max_x - min_x, max_y - min_y) >= pixel
+                simplified[piece_id] = (list(outline.coords), rotation_pivot) if visible else None
+            if simplified[piece_id] is None:
+                continue
+            vertices, rotation_pivot = simplified[piece_id]
+            piece = {'vertices': place_piece(vertices, rotation_pivot, piece_info)}
+            label = labels[piece_id - 1] if 0 <= (piece_id - 1) < len(labels) else str(piece_id)
+            polygon = Polygon(piece['vertices'])
+            min_x, min_y, max_x, max_y = polygon.bounds
+            # The label can never be larger than the smaller bbox side allows.
+            if GLYPH_HEIGHT * min(max_x - min_x, max_y - min_y) / 80 * scale >= min_label:
+                if not polygon.is_valid:
+                    polygon = max(shapely.get_parts(polygon.buffer(0)), key=lambda p: p.area, default=polygon)
+                if not polygon.is_empty and polygon.geom_type == 'Polygon':
+                    point = polylabel(polygon, tolerance=pixel)
+                    size = 2 * point.distance(polygon.exterior)
+                    if GLYPH_HEIGHT * size / 80 * scale >= min_label:
+                        piece.update(label=label, label_point=(point.x, point.y), label_size=size)
+            pieces.append(piece)
+        cells.append((origin_x, origin_y, pieces))
+    return scale, cells
+
+
+def render_overview_pdf(cells, scale, bin_dimension, page_size, file_name, title=None):
+    """Draws the overview cells on a single PDF page."""
+    c = canvas.Canvas(file_name, pagesize=page_size)
+    font = Romans()
+    fill_color = colors.Color(0.9, 0.9, 0.9, alpha=0.7)
+    if title:
+        c.setFont("Helvetica", 10)
+        c.drawString(MARGIN, page_size[1] - MARGIN + 6, title)
+    for number, (origin_x, origin_y, pieces) in enumerate(cells, start=1):
+        c.saveState()
+        c.translate(origin_x, origin_y)
+        c.scale(scale, scale)
+        c.setStrokeColor(colors.blue)
+        c.setLineWidth(0.5 / scale)
+        c.rect(0, 0, bin_dimension.width, bin_dimension.height)
+        for piece in pieces:
+            vertices = piece['vertices']
+            p = c.beginPath()
+            p.moveTo(vertices[0][0], vertices[0][1])
+            for point in vertices[1:]:
+                p.lineTo(point[0], point[1])
+            p.close()
+            c.setFillColor(fill_color)
+            c.setStrokeColor(colors.blue)
+            c.setLineWidth(0.25 / scale)
+            c.drawPath(p, fill=1, stroke=1)
+            if 'label' in piece:
+                draw_label(c, font, piece['label'], piece['label_point'], piece['label_size'])
+        c.restoreState()
+        c.setFont("Helvetica", 6)
+        c.setFillColor(colors.black)
+        c.drawString(origin_x, origin_y + bin_dimension.height * scale + 2, f"Bin {number}")
+    c.showPage()
+    c.save()
+
+
+def render_overview_png(cells, scale, bin_dimension, page_size, file_name, dpi=150):
+    """Rasterizes the overview cells with Pillow, which is only needed for this backend."""
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        raise RuntimeError("PNG output needs Pillow (pip install pillow)")
+    zoom = dpi / 72.0
+    image = Image.new('RGB', (round(page_size[0] * zoom), round(page_size[1] * zoom)), 'white')
+    draw = ImageDraw.Draw(image)
+    font = Romans()
+
+    def to_pixels(origin_x, origin_y, points):
+        return [((origin_x + x * scale) * zoom, (page_size[1] - origin_y - y * scale) * zoom) for x, y in points]
+
+    for origin_x, origin_y, pieces in cells:
+        draw.rectangle([*to_pixels(origin_x, origin_y, [(0, bin_dimension.height)])[0],
+                        *to_pixels(origin_x, origin_y, [(bin_dimension.width, 0)])[0]], outline=(0, 0, 255))
+        for piece in pieces:
+            draw.polygon(to_pixels(origin_x, origin_y, piece['vertices']), fill=(230, 230, 230), outline=(0, 0, 255))
+        for piece in pieces:
+            if 'label' not in piece:
+                continue
+            # Same runs as draw_label in the PDF backend: block id and the rest in their own size and colour.
+            for color, paths, x_offset, y_offset in label_strokes(font, piece['label'], piece['label_point'],
+                                                                  piece['label_size']):
+                fill = tuple(round(255 * channel) for channel in color.rgb())
+                for path in paths:
+                    points = to_pixels(origin_x, origin_y, [(x + x_offset, y + y_offset) for x, y in path.tolist()])
+                    if len(points) > 1:
+                        draw.line(points, fill=fill)
+    image.save(file_name)
+
+
+def _page_size(name):
+    """Parses 'A1', 'A3-landscape' or 'WIDTHxHEIGHT' (points) into a (width, height) tuple."""
+    landscape = name.lower().endswith('-landscape')
+    name = name[:-len('-landscape')] if landscape else name
+    if 'x' in name:
+        size = tuple(float(v) for v in name.split('x'))
+    else:
+        size = getattr(pagesizes, name.upper())
+    return pagesizes.landscape(size) if landscape else size
+
+
+def main():
+    """Renders all the sheets of a project on one overview page."""
+    parser = argparse.ArgumentParser(description="Render every sheet of a project on one overview page.")
+    parser.add_argument("shapes_file")
+    parser.add_argument("positions_file")
+    parser.add_argument("slices_file")
+    parser.add_argument("--page-size", default="A3-landscape", help="A0-A4[-landscape] or WIDTHxHEIGHT in points")
+    parser.add_argument("--dpi", type=float, default=150, help="target device resolution (default: 150)")
+    parser.add_argument("--min-label", type=float, default=4, help="smallest label drawn, in points (default: 4)")
+    parser.add_argument("--png", action="store_true", help="write a PNG instead of a PDF")
+    args = parser.parse_args()
+
+    try:
+        page_size = _page_size(args.page_size)
+    except (AttributeError, ValueError):
+        print(f"Error: Unknown page size '{args.page_size}'")
+        sys.exit(1)
+    try:
+        bin_dimension, original_pieces_data = parse_problem_file(args.shapes_file)
+        labels = parse_slices_file(args.slices_file)
+        unresolved = []
+        bins_data = parse_posiciones_file(args.positions_file, build_tag_index(labels), unresolved)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    report_unresolved_tags(unresolved, args.positions_file)
+    if not bins_data:
+        print(f"Error: No data found in positions file '{args.positions_file}'")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    scale, cells = overview_layout(bins_data, bin_dimension, original_pieces_data, labels, page_size,
+                                   args.dpi, args.min_label)
+    base_name = os.path.splitext(os.path.basename(args.shapes_file))[0]
+    if args.png:
+        output_filename = f"{base_name}-overview.png"
+        try:
+            render_overview_png(cells, scale, bin_dimension, page_size, output_filename, args.dpi)
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    else:
+        output_filename = f"{base_name}-overview.pdf"
+        render_overview_pdf(cells, scale, bin_dimension, page_size, output_filename, title=base_name)
+    print(f"{len(cells)} bins rendered to {output_filename} in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+import sys
+import os
+import csv
+import math
+import time
+import argparse
+
+import numpy as np
+
+from visual_vector_slices import parse_problem_file
+
+SAMPLES = 256    # points per outline for the descriptors and the coarse alignment
+SIGNATURE = 16   # turning-function harmonics used as a shape signature
+
+
+def parse_slices_outlines(file_path):
+    """Returns the (tag, vertices) of every line of a slices file."""
+    outlines = []
+    with open(file_path, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            values = []
+            for token in parts[1:]:
+                try:
+                    values.append(float(token))
+                except ValueError:
+                    continue
+            values = values[:len(values) // 2 * 2]
+            outlines.append((parts[0], list(zip(values[0::2], values[1::2]))))
+    return outlines
+
+
+def resample(vertices, samples=SAMPLES):
+    """Resamples a closed outline at equal arc-length steps, counter-clockwise, as complex numbers."""
+    points = np.asarray(vertices, dtype=float).reshape(-1, 2)
+    if not np.array_equal(points[0], points[-1]):
+        points = np.vstack([points, points[:1]])
+    lengths = np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(points, axis=0).T))])
+    steps = np.linspace(0.0, lengths[-1], samples, endpoint=False)
+    z = np.interp(steps, lengths, points[:, 0]) + 1j * np.interp(steps, lengths, points[:, 1])
+    signed_area = np.sum(points[:-1, 0] * points[1:, 1] - points[1:, 0] * points[:-1, 1])
+    return z[::-1] if signed_area < 0 else z
+
+
+def descriptors(outlines):
+    """Computes rigid- and reflection-invariant descriptors of many resampled outlines.
+
+    Args:
+        outlines: (n, SAMPLES) complex array from resample.
+
+    Returns:
+        An (n, k) array: log area, log perimeter, log principal radii of
+        gyration and the low harmonics of the turning function.
+    """
+    centred = outlines - outlines.mean(axis=1, keepdims=True)
+    edges = np.roll(outlines, -1, axis=1) - outlines
+    perimeter = np.abs(edges).sum(axis=1)
+    area = 0.5 * np.abs(np.imag(np.conj(outlines) * np.roll(outlines, -1, axis=1)).sum(axis=1))
+    # Eigenvalues of the 2x2 covariance, from its trace and the modulus of E[z^2].
+    trace = (np.abs(centred) ** 2).mean(axis=1)
+    spread = np.abs((centred ** 2).mean(axis=1))
+    radii = np.sqrt(np.maximum(np.column_stack([trace + spread, trace - spread]) / 2, 1e-12))
+    # Turning function minus the steady 2π turn of a closed curve; its
+    # harmonic magnitudes ignore rotation, start point and reflection.
+    turning = np.unwrap(np.angle(edges), axis=1)
+    turning -= 2 * np.pi * np.arange(outlines.shape[1]) / outlines.shape[1]
+    harmonics = np.abs(np.fft.rfft(turning, axis=1)[:, 1:SIGNATURE + 1]) / outlines.shape[1]
+    return np.column_stack([np.log(np.maximum(area, 1e-12)), np.log(perimeter), np.log(radii), harmonics])
+
+
+def coarse_align(source, target):
+    """Finds the rigid transform, possibly reflected, taking one resampled outline onto another.
+
+    For every cyclic shift the best rotation has a closed form (complex
+    Procrustes); all shifts are scored at once with an FFT correlation.
+
+    Returns:
+        (mirrored, rotation, shift, rms) with rotation in radians, applied to
+        the centred source after the optional reflection z -> conj(z), and
+        the rms distance between corresponding samples.
+    """
+    a = source - source.mean()
+    b = target - target.mean()
+    best = None
+    for mirrored in (False, True):
+        # Mirroring reverses the winding, so the samples are reversed to stay CCW.
+        candidate = np.conj(a)[::-1] if mirrored else a
+        correlation = np.fft.ifft(np.conj(np.fft.fft(candidate)) * np.fft.fft(b))
+        shift = int(np.argmax(np.abs(correlation)))
+        score = np.abs(correlation[shift])
+        if best is None or score > best[0]:
+            best = (score, mirrored, float(np.angle(correlation[shift])), shift)
+    score, mirrored, rotation, shift = best
+    residual = (np.sum(np.abs(a) ** 2) + np.sum(np.abs(b) ** 2) - 2 * score) / len(a)
+    return mirrored, rotation, shift, float(np.sqrt(max(residual, 0.0)))
+
+
+def match_outlines(source, target, expected=None, candidates=4):
+    """Pairs source and target outlines.
+
+    Descriptor distances (with features standardised over both sets)
+    shortlist a few targets per source, plus the target on the same line,
+    which is the expected correspondence (`expected[i]`, or the same
+    index when not given; -1 for none). The shortlist is ranked by the
+    residual of the coarse alignment, since descriptors cannot tell a piece
+    from its mirror twin. Pairs are then taken greedily, best first, each
+    outline being used once.
+
+    Returns:
+        An array with, per source outline, the index of its target (-1 if
+        there were more sources than targets).
+    """
+    a, b = descriptors(source), descriptors(target)
+    if expected is None:
+        expected = np.where(np.arange(len(a)) < len(b), np.arange(len(a)), -1)
+    scale = np.vstack([a, b]).std(axis=0) + 1e-9
+    costs = np.sqrt((((a[:, None, :] - b[None, :, :]) / scale) ** 2).sum(axis=2))
+    pairs = []
+    for i, row in enumerate(costs):
+        shortlist = set(np.argsort(row)[:candidates].tolist())
+        if expected[i] >= 0:
+            shortlist.add(int(expected[i]))
+        for j in shortlist:
+            residual = coarse_align(source[i], target[j])[3]
+            # Near-ties go to the same line.
+            pairs.append((residual * (0.9 if j == expected[i] else 1.0), i, j))
+    matches = np.full(len(a), -1)
+    used = np.zeros(len(b), dtype=bool)
+    for _, i, j in sorted(pairs):
+        if matches[i] < 0 and not used[j]:
+            matches[i] = j
+            used[j] = True
+    return matches
+
+
+def _rigid_fit(points, targets):
+    """Least-squares rotation and translation (Kabsch, in complex form) taking points onto targets."""
+    pc, tc = points.mean(), targets.mean()
+    rotation = np.angle(np.sum(np.conj(points - pc) * (targets - tc)))
+    return rotation, tc - np.exp(1j * rotation) * pc
+
+
+def refine(vertices, target_vertices, mirrored, rotation, shift, iterations=10, density=4, window=32):
+    """Refines a coarse alignment with point-to-point ICP.
+
+    Equal arc-length samples of the source are matched to their nearest
+    point on a `density` times denser resampling of the target, and a rigid
+    fit is repeated until it settles. The coarse shift tells where along the
+    target each sample lies, so only `window` dense points either side of
+    that are searched.
+
+    Returns:
+        (rotation, translation, rms) of the final fit, translation as complex.
+    """
+    z = resample(vertices)
+    if mirrored:
+        z = np.conj(z)[::-1]
+    target = resample(target_vertices, density * len(z))
+    expected = density * (np.arange(len(z)) + shift)
+    candidates = (expected[:, None] + np.arange(-window, window + 1)[None, :]) % len(target)
+    translation = target.mean() - np.exp(1j * rotation) * z.mean()
+    rms = np.inf
+    for _ in range(iterations):
+        moved = np.exp(1j * rotation) * z + translation
+        offsets = target[candidates] - moved[:, None]
+        nearest_index = candidates[np.arange(len(z)), np.argmin(offsets.real ** 2 + offsets.imag ** 2, axis=1)]
+        nearest = target[nearest_index]
+        rotation, translation = _rigid_fit(z, nearest)
+        new_rms = float(np.sqrt(np.mean(np.abs(np.exp(1j * rotation) * z + translation - nearest) ** 2)))
+        if rms - new_rms < 1e-3:
+            rms = new_rms
+            break
+        rms = new_rms
+    return rotation, translation, rms
+
+
+def register(slices_outlines, original_pieces_data):
+    """Registers every slices outline onto its Shapes outline.
+
+    Args:
+        slices_outlines: (tag, vertices) pairs from parse_slices_outlines.
+        original_pieces_data: The pieces dict from parse_problem_file.
+
+    Returns:
+        One dict per slice with its 'tag', its 'line' (1-based), the matched
+        'piece_id' (None if unmatched, as are outlines of fewer than three
+        vertices), whether the fit is 'mirrored' (x -> -x), the 'angle' in
+        degrees and 'translation' (tx, ty) applied after the mirror, and the
+        'rms' distance in mm.
+    """
+    piece_ids = sorted(original_pieces_data)
+    target_index = {piece_id: index for index, piece_id in enumerate(piece_ids)}
+    # Degenerate outlines are left unmatched but keep their line, which is the piece id.
+    usable = [index for index, (_, vertices) in enumerate(slices_outlines) if len(vertices) >= 3]
+    source = np.array([resample(slices_outlines[index][1]) for index in usable])
+    target = np.array([resample(original_pieces_data[piece_id][0]) for piece_id in piece_ids])
+    expected = np.array([target_index.get(index + 1, -1) for index in usable], dtype=int)
+    matches = dict(zip(usable, match_outlines(source, target, expected))) if usable else {}
+    results = []
+    for line, (tag, vertices) in enumerate(slices_outlines, start=1):
+        result = {'tag': tag, 'line': line, 'piece_id': None}
+        match = matches.get(line - 1, -1)
+        if match >= 0:
+            piece_id = piece_ids[match]
+            mirrored, rotation, shift, _ = coarse_align(source[usable.index(line - 1)], target[match])
+            rotation, translation, rms = refine(vertices, original_pieces_data[piece_id][0], mirrored, rotation,
+                                                shift)
+            # Report the reflection as x -> -x, the flip the portrait script applies:
+            # conj(z) == -(x -> -x)(z), which is half a turn more.
+            angle = math.degrees(rotation + math.pi) if mirrored else math.degrees(rotation)
+            result.update(piece_id=piece_id, mirrored=mirrored, angle=(angle + 180) % 360 - 180,
+                          translation=(translation.real, translation.imag), rms=rms)
+        results.append(result)
+    return results
+
+
+def apply_registration(vertices, result):
+    """Moves slices vertices into the Shapes frame with a registration result."""
+    angle = math.radians(result['angle'])
+    cos_theta, sin_theta = math.cos(angle), math.sin(angle)
+    tx, ty = result['translation']
+    sign = -1 if result['mirrored'] else 1
+    return [(cos_theta * sign * x - sin_theta * y + tx, sin_theta * sign * x + cos_theta * y + ty)
+            for x, y in vertices]
+
+
+def orientation_disagrees(result, angle_tolerance=1.0):
+    """True when a slice is not just a horizontal flip of its Shapes outline, as the portrait script assumes."""
+    return not result['mirrored'] or abs(result['angle']) > angle_tolerance
+
+
+def main():
+    """Registers the slices outlines of a project against its Shapes outlines."""
+    parser = argparse.ArgumentParser(description="Match slices outlines to Shapes outlines and find their transforms.")
+    parser.add_argument("shapes_file")
+    parser.add_argument("slices_file")
+    parser.add_argument("--angle-tolerance", type=float, default=1.0,
+                        help="largest rotation in degrees still consistent with a plain flip (default: 1)")
+    parser.add_argument("-o", "--output", help="output CSV (default: <shapes>-registration.csv)")
+    parser.add_argument("--write-slices", metavar="FILE",
+                        help="also write the slices file with every outline moved into the Shapes frame")
+    args = parser.parse_args()
+
+    try:
+        _, original_pieces_data = parse_problem_file(args.shapes_file)
+        slices_outlines = parse_slices_outlines(args.slices_file)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if not any(len(vertices) >= 3 for _, vertices in slices_outlines) or not original_pieces_data:
+        print("Error: No outlines found")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    results = register(slices_outlines, original_pieces_data)
+    elapsed = time.perf_counter() - start
+
+    output_filename = args.output
+    if not output_filename:
+        base_name = os.path.splitext(os.path.basename(args.shapes_file))[0]
+        output_filename = f"{base_name.replace('-Shapes', '')}-registration.csv"
+    reordered = disagreeing = 0
+    with open(output_filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['line', 'tag', 'piece_id', 'mirrored', 'angle', 'tx', 'ty', 'rms', 'flip_only'])
+        for result in results:
+            if result['piece_id'] is None:
+                writer.writerow([result['line'], result['tag'], '', '', '', '', '', '', ''])
+                print(f"  {result['tag']}: no matching Shapes outline")
+                continue
+            flip_only = not orientation_disagrees(result, args.angle_tolerance)
+            writer.writerow([result['line'], result['tag'], result['piece_id'], int(result['mirrored']),
+                             f"{result['angle']:.3f}", f"{result['translation'][0]:.3f}",
+                             f"{result['translation'][1]:.3f}", f"{result['rms']:.3f}", int(flip_only)])
+            if result['piece_id'] != result['line']:
+                reordered += 1
+                print(f"  {result['tag']}: line {result['line']} matches Shapes piece {result['piece_id']}")
+            if not flip_only:
+                disagreeing += 1
+
+    if args.write_slices:
+        # The same lines parse_slices_outlines kept, so unmatched ones can be copied as they are.
+        with open(args.slices_file) as f:
+            source_lines = [line.rstrip('\n') for line in f if line.split()]
+        with open(args.write_slices, 'w') as f:
+            for source_line, (tag, vertices), result in zip(source_lines, slices_outlines, results):
+                if result['piece_id'] is None:
+                    f.write(source_line + '\n')
+                    continue
+                vertices = apply_registration(vertices, result)
+                f.write(tag + ' ' + ' '.join(f"{x:.3f} {y:.3f}" for x, y in vertices) + '\n')
+        print(f"Registered slices saved to {args.write_slices}")
+
+    fitted = [r['rms'] for r in results if r['piece_id'] is not None]
+    quality = f", median rms {np.median(fitted):.2f} mm, worst {max(fitted):.2f} mm" if fitted else ""
+    print(f"{len(fitted)} of {len(results)} outlines registered in {elapsed:.2f}s{quality}")
+    print(f"{reordered} outlines are not on the line of their Shapes piece; "
+          f"{disagreeing} need more than the horizontal flip")
+    print(f"Registration saved to {output_filename}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import sys
+import os
+import time
+import argparse
+
+import shapely
+from shapely.geometry import Polygon, LineString, box
+from shapely.ops import split
+
+from visual_vector_slices import (parse_problem_file, parse_slices_file, build_tag_index, parse_posiciones_file,
+                                  report_unresolved_tags, place_piece)
+
+
+def placed_polygons(bin_info, original_pieces_data):
+    """Returns the valid shapely polygons of the pieces placed in a bin."""
+    polygons = []
+    for piece_info in bin_info['placed_pieces']:
+        piece_id = piece_info['id']
+        if piece_id not in original_pieces_data:
+            continue
+        original_vertices, rotation_pivot = original_pieces_data[piece_id]
+        polygon = Polygon(place_piece(original_vertices, rotation_pivot, piece_info))
+        if not polygon.is_valid:
+            polygon = polygon.buffer(0)
+        if not polygon.is_empty:
+            polygons.append(polygon)
+    return polygons
+
+
+def _split_holes(polygon):
+    """Cuts a polygon through each of its holes until none are left.
+
+    Shapes.txt can only describe a single outer ring per line, so a remnant
+    that surrounds a placed part is split by a vertical line through that part.
+    """
+    if not polygon.interiors:
+        return [polygon]
+    hole_x = Polygon(polygon.interiors[0]).representative_point().x
+    _, min_y, _, max_y = polygon.bounds
+    pieces = []
+    for geom in split(polygon, LineString([(hole_x, min_y - 1), (hole_x, max_y + 1)])).geoms:
+        pieces.extend(_split_holes(geom))
+    return pieces
+
+
+def bin_remnants(bin_dimension, polygons, min_area=10000, min_width=50):
+    """Computes the usable offcuts of one bin.
+
+    The free area is the bin rectangle minus the union of the placed parts.
+    A morphological opening by half of `min_width` then removes slivers and
+    narrow necks, and regions smaller than `min_area` are discarded.
+
+    Args:
+        bin_dimension: The BinDimension of the sheet.
+        polygons: The placed part polygons.
+        min_area: Smallest remnant area worth keeping, in mm².
+        min_width: Smallest usable width of a remnant, in mm.
+
+    Returns:
+        A list of hole-free shapely polygons, largest first.
+    """
+    free_area = box(0, 0, bin_dimension.width, bin_dimension.height)
+    if polygons:
+        free_area = free_area.difference(shapely.union_all(polygons))
+    if min_width:
+        free_area = free_area.buffer(-min_width / 2, join_style='mitre').buffer(min_width / 2, join_style='mitre')
+    remnants = []
+    for geom in shapely.get_parts(free_area):
+        if geom.area < min_area:
+            continue
+        remnants.extend(part for part in _split_holes(geom) if part.area >= min_area)
+    return sorted(remnants, key=lambda p: p.area, reverse=True)
+
+
+def write_remnants_file(file_path, bin_dimension, remnants):
+    """Writes remnant outlines in the Shapes.txt format."""
+    with open(file_path, 'w') as f:
+        f.write(f"{bin_dimension.width:g} {bin_dimension.height:g}\n")
+        f.write(f"{len(remnants)}\n")
+        for remnant in remnants:
+            coords = remnant.exterior.coords
+            f.write(' '.join(f"{x:.3f},{y:.3f}" for x, y in coords) + '\n')
+
+
+def main():
+    """Extracts the reusable offcuts of every sheet of a nesting solution."""
+    parser = argparse.ArgumentParser(description="Extract reusable remnants from a nesting solution.")
+    parser.add_argument("shapes_file")
+    parser.add_argument("positions_file")
+    parser.add_argument("--slices", help="slices file, needed to resolve a tagged positions file")
+    parser.add_argument("--min-area", type=float, default=10000, help="minimum remnant area in mm² (default: 10000)")
+    parser.add_argument("--min-width", type=float, default=50, help="minimum remnant width in mm (default: 50)")
+    parser.add_argument("-o", "--output", help="output file (default: <shapes>-remnants-Shapes.txt)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        bin_dimension, original_pieces_data = parse_problem_file(args.shapes_file)
+    except FileNotFoundError:
+        print(f"Error: Shapes file not found at '{args.shapes_file}'")
+        sys.exit(1)
+    unresolved = []
+    try:
+        tag_index = build_tag_index(parse_slices_file(args.slices)) if args.slices else None
+        bins_data = parse_posiciones_file(args.positions_file, tag_index, unresolved)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    report_unresolved_tags(unresolved, args.positions_file)
+    if not bins_data:
+        print(f"Error: No data found in positions file '{args.positions_file}'")
+        sys.exit(1)
+
+    all_remnants = []
+    for bin_info in bins_data:
+        polygons = placed_polygons(bin_info, original_pieces_data)
+        remnants = bin_remnants(bin_dimension, polygons, args.min_area, args.min_width)
+        usable = sum(r.area for r in remnants)
+        print(f"  Bin {bin_info['number']}: {len(remnants)} remnants, {usable / 1e6:.3f} m² usable "
+              f"(lines {len(all_remnants) + 3}-{len(all_remnants) + len(remnants) + 2})" if remnants else
+              f"  Bin {bin_info['number']}: no usable remnants")
+        all_remnants.extend(remnants)
+
+    output_filename = args.output
+    if not output_filename:
+        base_name = os.path.splitext(os.path.basename(args.shapes_file))[0]
+        output_filename = f"{base_name.replace('-Shapes', '')}-remnants-Shapes.txt"
+    write_remnants_file(output_filename, bin_dimension, all_remnants)
+    print(f"{len(all_remnants)} remnants from {len(bins_data)} bins saved to {output_filename} "
+          f"in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import sys
+import os
+import time
+import hashlib
+import argparse
+
+import numpy as np
+from shapely.geometry import Polygon
+from reportlab.pdfgen import canvas
+from reportlab.lib import colors
+
+from visual_vector_slices import (parse_problem_file, parse_slices_file, build_tag_index, parse_posiciones_file,
+                                  report_unresolved_tags, place_piece)
+
+CAPTION = 40  # height of the caption band above the sheet, in points
+
+
+def bin_signature(bin_info, quantum=0.01):
+    """Hashes the placements of a bin, independently of the order they are listed in.
+
+    Positions are snapped to a grid of `quantum` mm and rotations to a
+    thousandth of a degree, so two bins with the same hash hold the same
+    pieces at the same places.
+    """
+    rows = sorted((piece_info['id'], round(piece_info['rotation'] * 1000) % 360000,
+                   int(np.floor(piece_info['x'] / quantum + 0.5)), int(np.floor(piece_info['y'] / quantum + 0.5)))
+                  for piece_info in bin_info['placed_pieces'])
+    return hashlib.blake2b(np.array(rows, dtype=np.int64).tobytes(), digest_size=16).digest()
+
+
+def _same_place(a, b, quantum):
+    return abs(a['x'] - b['x']) < quantum and abs(a['y'] - b['y']) < quantum
+
+
+def _same_rotation(a, b):
+    # Round before wrapping, so 359.9999 and 0 are the same rotation.
+    return round(a['rotation'] * 1000) % 360000 == round(b['rotation'] * 1000) % 360000
+
+
+def diff_solutions(bins_a, bins_b, quantum=0.01):
+    """Compares two nesting solutions of the same Shapes file.
+
+    Bins with identical signatures are matched with a dict lookup and not
+    looked at again. The remaining bins are paired greedily by the number
+    of pieces they share; a bin left without a partner is a sheet added or
+    removed.
+
+    Returns:
+        The number of identical bins and a list of (bin_a, bin_b, changes)
+        for the other pairs, where either bin may be None and changes is a
+        list of (kind, piece_a, piece_b) with kind one of 'moved',
+        'rotated', 'added' or 'removed' and the placement dicts of the
+        piece in each solution (None where it is absent). A piece that
+        changes sheet is 'removed' from one pair and 'added' to another.
+    """
+    unmatched_b = {}
+    for bin_info in bins_b:
+        unmatched_b.setdefault(bin_signature(bin_info, quantum), []).append(bin_info)
+    changed_a = []
+    identical = 0
+    for bin_info in bins_a:
+        same = unmatched_b.get(bin_signature(bin_info, quantum))
+        if same:
+            same.pop()
+            identical += 1
+        else:
+            changed_a.append(bin_info)
+    changed_b = [bin_info for bins in unmatched_b.values() for bin_info in bins]
+
+    bin_of_b = {}
+    for index, bin_info in enumerate(changed_b):
+        for piece_info in bin_info['placed_pieces']:
+            bin_of_b[piece_info['id']] = index
+    shared = {}
+    for index_a, bin_info in enumerate(changed_a):
+        for piece_info in bin_info['placed_pieces']:
+            if piece_info['id'] in bin_of_b:
+                key = (index_a, bin_of_b[piece_info['id']])
+                shared[key] = shared.get(key, 0) + 1
+    partner_a, partner_b = {}, {}
+    for (index_a, index_b), _ in sorted(shared.items(), key=lambda item: -item[1]):
+        if index_a not in partner_a and index_b not in partner_b:
+            partner_a[index_a] = index_b
+            partner_b[index_b] = index_a
+
+    pairs = [(bin_info, changed_b[partner_a[index]] if index in partner_a else None)
+             for index, bin_info in enumerate(changed_a)]
+    pairs += [(None, bin_info) for index, bin_info in enumerate(changed_b) if index not in partner_b]
+    result = []
+    for bin_a, bin_b in pairs:
+        pieces_a = {p['id']: p for p in bin_a['placed_pieces']} if bin_a else {}
+        pieces_b = {p['id']: p for p in bin_b['placed_pieces']} if bin_b else {}
+        changes = []
+        for piece_id, piece_a in pieces_a.items():
+            piece_b = pieces_b.get(piece_id)
+            if piece_b is None:
+                changes.append(('removed', piece_a, None))
+            elif not _same_rotation(piece_a, piece_b):
+                changes.append(('rotated', piece_a, piece_b))
+            elif not _same_place(piece_a, piece_b, quantum):
+                changes.append(('moved', piece_a, piece_b))
+        changes += [('added', None, piece_b) for piece_id, piece_b in pieces_b.items() if piece_id not in pieces_a]
+        if changes:
+            result.append((bin_a, bin_b, changes))
+        else:
+            # Hashes snap to a grid, so placements within `quantum` may still hash differently.
+            identical += 1
+    return identical, result
+
+
+def utilization(bin_info, piece_areas, bin_dimension):
+    """Returns the fraction of the sheet covered by a bin's pieces (0 for a missing bin)."""
+    if bin_info is None:
+        return 0.0
+    area = sum(piece_areas.get(piece_info['id'], 0.0) for piece_info in bin_info['placed_pieces'])
+    return area / (bin_dimension.width * bin_dimension.height)
+
+
+def _outline_path(c, vertices):
+    p = c.beginPath()
+    p.moveTo(vertices[0][0], vertices[0][1])
+    for point in vertices[1:]:
+        p.lineTo(point[0], point[1])
+    p.close()
+    return p
+
+
+def render_diff_pdf(pairs, bin_dimension, original_pieces_data, piece_areas, labels, file_name):
+    """Draws one page per changed pair of bins, the second solution over the first.
+
+    Unchanged pieces are light grey. A piece's new place is filled green
+    and its old place is outlined in dashed red, so moved and rotated
+    pieces show both; pieces that left or reached the sheet only show one.
+    The caption gives both bin numbers and the utilization change.
+    """
+    width, height = bin_dimension.width, bin_dimension.height
+    c = canvas.Canvas(file_name, pagesize=(width, height + CAPTION))
+    unchanged_fill = colors.Color(0.9, 0.9, 0.9, alpha=0.7)
+    new_fill = colors.Color(0.3, 0.8, 0.3, alpha=0.5)
+
+    def vertices(piece_info):
+        original_vertices, rotation_pivot = original_pieces_data[piece_info['id']]
+        return place_piece(original_vertices, rotation_pivot, piece_info)
+
+    def tag(piece_info):
+        piece_id = piece_info['id']
+        return labels[piece_id - 1] if 0 <= piece_id - 1 < len(labels) else str(piece_id)
+
+    for bin_a, bin_b, changes in pairs:
+        changed = {(piece_a or piece_b)['id'] for _, piece_a, piece_b in changes}
+        c.setStrokeColor(colors.blue)
+        c.setLineWidth(0.5)
+        c.rect(0, 0, width, height)
+        for piece_info in (bin_b or bin_a)['placed_pieces']:
+            if piece_info['id'] in changed or piece_info['id'] not in original_pieces_data:
+                continue
+            c.setFillColor(unchanged_fill)
+            c.drawPath(_outline_path(c, vertices(piece_info)), fill=1, stroke=1)
+        c.setFont("Helvetica", 12)
+        for kind, piece_a, piece_b in changes:
+            piece_id = (piece_a or piece_b)['id']
+            if piece_id not in original_pieces_data:
+                continue
+            if piece_b is not None:
+                c.setFillColor(new_fill)
+                c.setStrokeColor(colors.darkgreen)
+                c.setLineWidth(1)
+                c.drawPath(_outline_path(c, vertices(piece_b)), fill=1, stroke=1)
+            if piece_a is not None:
+                c.setStrokeColor(colors.red)
+                c.setLineWidth(1)
+                c.setDash(6, 4)
+                c.drawPath(_outline_path(c, vertices(piece_a)), fill=0, stroke=1)
+                c.setDash()
+            point = Polygon(vertices(piece_b or piece_a)).representative_point()
+            c.setFillColor(colors.black)
+            c.drawCentredString(point.x, point.y, f"{tag(piece_b or piece_a)} {kind}")
+        before = utilization(bin_a, piece_areas, bin_dimension)
+        after = utilization(bin_b, piece_areas, bin_dimension)
+        caption = (f"Bin {bin_a['number'] if bin_a else '-'} -> Bin {bin_b['number'] if bin_b else '-'}: "
+                   f"{len(changes)} changes, utilization {100 * before:.1f}% -> {100 * after:.1f}% "
+                   f"({100 * (after - before):+.1f})")
+        c.setFont("Helvetica", 20)
+        c.setFillColor(colors.black)
+        c.drawString(10, height + 12, caption)
+        c.showPage()
+    c.save()
+
+
+def main():
+    """Compares two nesting solutions of the same Shapes file."""
+    parser = argparse.ArgumentParser(description="Show what changed between two posiciones files.")
+    parser.add_argument("shapes_file")
+    parser.add_argument("positions_a", help="the reference solution")
+    parser.add_argument("positions_b", help="the solution compared with it")
+    parser.add_argument("--slices", help="slices file, used for tags and to resolve tagged positions files")
+    parser.add_argument("--quantum", type=float, default=0.01,
+                        help="positions closer than this (mm) are the same (default: 0.01)")
+    parser.add_argument("-o", "--output", help="overlay PDF of the changed sheets (default: <shapes>-diff.pdf)")
+    args = parser.parse_args()
+
+    try:
+        bin_dimension, original_pieces_data = parse_problem_file(args.shapes_file)
+        labels = parse_slices_file(args.slices) if args.slices else []
+        tag_index = build_tag_index(labels) if labels else None
+        solutions = []
+        for positions_file in (args.positions_a, args.positions_b):
+            unresolved = []
+            solutions.append(parse_posiciones_file(positions_file, tag_index, unresolved))
+            report_unresolved_tags(unresolved, positions_file)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    bins_a, bins_b = solutions
+
+    def tag(piece_info):
+        piece_id = piece_info['id']
+        return labels[piece_id - 1] if 0 <= piece_id - 1 < len(labels) else str(piece_id)
+
+    start = time.perf_counter()
+    identical, pairs = diff_solutions(bins_a, bins_b, args.quantum)
+    piece_areas = {piece_id: Polygon(vertices).area for piece_id, (vertices, _) in original_pieces_data.items()}
+    for bin_a, bin_b, changes in pairs:
+        counts = {kind: sum(change[0] == kind for change in changes) for kind in ('moved', 'rotated', 'added', 'removed')}
+        before = utilization(bin_a, piece_areas, bin_dimension)
+        after = utilization(bin_b, piece_areas, bin_dimension)
+        print(f"  Bin {bin_a['number'] if bin_a else '-'} -> Bin {bin_b['number'] if bin_b else '-'}: "
+              + ', '.join(f"{count} {kind}" for kind, count in counts.items())
+              + f", utilization {100 * before:.1f}% -> {100 * after:.1f}% ({100 * (after - before):+.1f})")
+        for kind, piece_a, piece_b in changes:
+            if kind in ('moved', 'rotated'):
+                print(f"    {tag(piece_a)} {kind}: {piece_a['rotation'] % 360:g} at ({piece_a['x']:g}, {piece_a['y']:g})"
+                      f" -> {piece_b['rotation'] % 360:g} at ({piece_b['x']:g}, {piece_b['y']:g})")
+            else:
+                print(f"    {tag(piece_a or piece_b)} {kind}")
+    elapsed = time.perf_counter() - start
+    print(f"{len(bins_a)} vs {len(bins_b)} sheets: {identical} identical, {len(pairs)} changed "
+          f"({elapsed * 1000:.0f} ms)")
+
+    if pairs:
+        output_filename = args.output
+        if not output_filename:
+            base_name = os.path.splitext(os.path.basename(args.shapes_file))[0]
+            output_filename = f"{base_name.replace('-Shapes', '')}-diff.pdf"
+        render_diff_pdf(pairs, bin_dimension, original_pieces_data, piece_areas, labels, output_filename)
+        print(f"Changed sheets saved to {output_filename}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import re
+import sys
+import zlib
+import argparse
+
+from reportlab.lib.rl_accel import fp_str
+from reportlab.pdfgen.canvas import PATH_OPS, FILL_EVEN_ODD
+from reportlab.pdfgen.pathobject import PDFPathObject
+
+# Object numbers reserved for the objects only known once the last page is written.
+CATALOG = 1
+PAGES = 2
+
+# After every page a comment lists the objects written since the previous
+# one, so recover_pdf never has to parse (possibly binary) object bodies.
+_CHECKPOINT = re.compile(rb'\n%checkpoint page=(\d+) objects=([\d:, ]*)\n')
+
+
+class StreamingCanvas:
+    """A canvas that writes every page to disk as soon as it is finished.
+
+    reportlab's Canvas keeps all pages in memory until save(). This class
+    implements the subset of its API used by the renderers in this package
+    (colours with alpha, line width, rectangles, path objects, the graphics
+    state stack, transforms and Form XObjects) and appends each page's
+    content stream, page object and any new forms or ExtGStates to the
+    file on showPage. Only the page tree, catalog, cross-reference table
+    and trailer are left for save(), so memory does not grow with the
+    number of pages. A comment after every page records where its objects
+    start, so a file cut short can be repaired with recover_pdf (or
+    `python streaming_pdf.py --recover FILE`).
+
+    Path objects are reportlab's own, so drawing code can use either canvas.
+    """
+
+    def __init__(self, file_name, pagesize=(595.27, 841.89), compression_level=6):
+        self._file = open(file_name, 'wb')
+        self._file.write(b'%PDF-1.4\n%\x93\x8c\x8b\x9e\n')
+        self._offsets = {}
+        self._unrecorded = []
+        self._next_object = PAGES + 1
+        self._pagesize = pagesize
+        self._compression_level = compression_level
+        self._page_objects = []
+        self._extgstates = {}   # (key, alpha) -> (name, object number)
+        self._forms = {}        # form name -> object number
+        self._form_data = None
+        self._code_stack = []
+        self._code = []
+        self._forms_in_use = set()
+        self._gs_in_use = set()
+        self._alpha = {'CA': 1, 'ca': 1}
+        self._alpha_stack = []
+        self._fill_mode = FILL_EVEN_ODD
+
+    def _allocate(self):
+        number = self._next_object
+        self._next_object += 1
+        return number
+
+    def _write_object(self, number, body, stream=None):
+        self._offsets[number] = self._file.tell()
+        self._unrecorded.append(number)
+        self._file.write(f"{number} 0 obj\n".encode('latin-1'))
+        if stream is None:
+            self._file.write(body.encode('latin-1') + b'\nendobj\n')
+            return
+        if self._compression_level:
+            stream = zlib.compress(stream, self._compression_level)
+            body = body[:-2] + f" /Filter /FlateDecode /Length {len(stream)} >>"
+        else:
+            body = body[:-2] + f" /Length {len(stream)} >>"
+        self._file.write(body.encode('latin-1') + b'\nstream\n' + stream + b'\nendstream\nendobj\n')
+
+    def _resources(self):
+        """Returns the resource dictionary of the stream being drawn, listing only what it uses."""
+        extgstates = ' '.join(f"/{name} {number} 0 R" for name, number in sorted(self._gs_in_use))
+        forms = ' '.join(f"/FormXob.{name} {self._forms[name]} 0 R" for name in sorted(self._forms_in_use))
+        return f"<< /ProcSet [ /PDF ] /ExtGState << {extgstates} >> /XObject << {forms} >> >>"
+
+    def _stream(self):
+        return ('\n'.join(self._code) + '\n').encode('latin-1')
+
+    def setPageSize(self, size):
+        self._pagesize = size
+
+    def _set_alpha(self, key, alpha):
+        if alpha is None or alpha == self._alpha[key]:
+            return
+        if (key, alpha) not in self._extgstates:
+            name = f"GS{len(self._extgstates)}"
+            number = self._allocate()
+            self._write_object(number, f"<< /Type /ExtGState /{key} {fp_str(alpha)} >>")
+            self._extgstates[key, alpha] = (name, number)
+        self._code.append(f"/{self._extgstates[key, alpha][0]} gs")
+        self._gs_in_use.add(self._extgstates[key, alpha])
+        self._alpha[key] = alpha
+
+    def setStrokeColor(self, color):
+        self._code.append(f"{fp_str(*color.rgb())} RG")
+        self._set_alpha('CA', getattr(color, 'alpha', None))
+
+    def setFillColor(self, color):
+        self._code.append(f"{fp_str(*color.rgb())} rg")
+        self._set_alpha('ca', getattr(color, 'alpha', None))
+
+    def setLineWidth(self, width):
+        self._code.append(f"{fp_str(width)} w")
+
+    def rect(self, x, y, width, height, stroke=1, fill=0):
+        self._code.append(f"n {fp_str(x, y, width, height)} re {PATH_OPS[stroke, fill, self._fill_mode]}")
+
+    def beginPath(self):
+        return PDFPathObject()
+
+    def drawPath(self, path, stroke=1, fill=0):
+        self._code.append(str(path.getCode()))
+        self._code.append(PATH_OPS[stroke, fill, self._fill_mode])
+
+    def saveState(self):
+        self._alpha_stack.append(dict(self._alpha))
+        self._code.append('q')
+
+    def restoreState(self):
+        self._alpha = self._alpha_stack.pop()
+        self._code.append('Q')
+
+    def transform(self, a, b, c, d, e, f):
+        self._code.append(f"{fp_str(a, b, c, d, e, f)} cm")
+
+    def beginForm(self, name):
+        """Starts collecting the operations of a form; the page being drawn is set aside."""
+        self._code_stack.append((self._code, self._forms_in_use, self._gs_in_use, self._alpha, self._alpha_stack))
+        self._code, self._forms_in_use, self._gs_in_use = [], set(), set()
+        self._alpha, self._alpha_stack = {'CA': 1, 'ca': 1}, []
+        self._form_data = name
+
+    def endForm(self):
+        """Writes the form to the file and resumes the page."""
+        width, height = self._pagesize
+        number = self._allocate()
+        self._forms[self._form_data] = number
+        self._write_object(number, f"<< /Type /XObject /Subtype /Form /FormType 1 "
+                                   f"/BBox [ 0 0 {fp_str(width, height)} ] /Resources {self._resources()} >>",
+                           self._stream())
+        self._code, self._forms_in_use, self._gs_in_use, self._alpha, self._alpha_stack = self._code_stack.pop()
+        self._form_data = None
+
+    def doForm(self, name):
+        self._code.append(f"/FormXob.{name} Do")
+        self._forms_in_use.add(name)
+
+    def showPage(self):
+        """Writes the current page and flushes it to disk."""
+        missing = self._forms_in_use - set(self._forms)
+        if missing:
+            raise ValueError(f"forms used before being defined: {', '.join(sorted(missing))}")
+        width, height = self._pagesize
+        contents = self._allocate()
+        self._write_object(contents, "<< >>", self._stream())
+        page = self._allocate()
+        self._write_object(page, f"<< /Type /Page /Parent {PAGES} 0 R /MediaBox [ 0 0 {fp_str(width, height)} ] "
+                                 f"/Contents {contents} 0 R /Resources {self._resources()} >>")
+        self._page_objects.append(page)
+        objects = ','.join(f"{number}:{self._offsets[number]}" for number in self._unrecorded)
+        self._file.write(f"%checkpoint page={page} objects={objects}\n".encode('latin-1'))
+        self._unrecorded = []
+        self._file.flush()
+        self._code = []
+        self._forms_in_use = set()
+        self._gs_in_use = set()
+        self._alpha = {'CA': 1, 'ca': 1}
+        self._alpha_stack = []
+
+    def save(self):
+        """Writes the page tree, catalog, cross-reference table and trailer, and closes the file."""
+        if self._code:
+            self.showPage()
+        _finish(self._file, self._offsets, self._page_objects, self._next_object)
+        self._file.close()
+
+    def close(self):
+        """Closes the file without finishing it, e.g. after a failed render.
+
+        The pages already written can still be rescued with recover_pdf.
+        """
+        self._file.close()
+
+
+def _finish(f, offsets, page_objects, size):
+    """Appends the objects that close a file written by StreamingCanvas."""
+    kids = ' '.join(f"{number} 0 R" for number in page_objects)
+    for number, body in ((PAGES, f"<< /Type /Pages /Count {len(page_objects)} /Kids [ {kids} ] >>"),
+                         (CATALOG, f"<< /Type /Catalog /Pages {PAGES} 0 R >>")):
+        offsets[number] = f.tell()
+        f.write(f"{number} 0 obj\n{body}\nendobj\n".encode('latin-1'))
+    xref = f.tell()
+    lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+    for number in range(1, size):
+        lines.append(f"{offsets[number]:010d} 00000 n \n" if number in offsets else "0000000000 65535 f \n")
+    f.write(''.join(lines).encode('latin-1'))
+    f.write(f"trailer\n<< /Size {size} /Root {CATALOG} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('latin-1'))
+
+
+def recover_pdf(file_name):
+    """Makes a StreamingCanvas file that was never saved readable again.
+
+    Everything after the last page checkpoint is dropped, then the page
+    tree, catalog and cross-reference table are rebuilt from the objects
+    the checkpoints list.
+
+    Returns:
+        The number of pages recovered.
+    """
+    with open(file_name, 'rb') as f:
+        data = f.read()
+    offsets = {}
+    page_objects = []
+    end = None
+    for match in _CHECKPOINT.finditer(data):
+        page_objects.append(int(match.group(1)))
+        for entry in match.group(2).decode('latin-1').split(','):
+            number, offset = entry.split(':')
+            offsets[int(number)] = int(offset)
+        end = match.end()
+    if end is None:
+        raise ValueError(f"'{file_name}' contains no complete page")
+    with open(file_name, 'r+b') as f:
+        f.truncate(end)
+        f.seek(end)
+        _finish(f, offsets, page_objects, max(offsets) + 1)
+    return len(page_objects)
+
+
+def main():
+    """Repairs PDFs that a StreamingCanvas never finished, e.g. because the job was killed."""
+    parser = argparse.ArgumentParser(description="Repair PDFs left unfinished by a --streaming render.")
+    parser.add_argument("--recover", nargs='+', required=True, metavar="FILE",
+                        help="unfinished PDF to repair in place; pages after the last complete one are dropped")
+    args = parser.parse_args()
+
+    failed = False
+    for file_name in args.recover:
+        try:
+            pages = recover_pdf(file_name)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            failed = True
+            continue
+        print(f"{file_name}: {pages} pages recovered")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from batch_pipeline import find_projects, run_pipeline
+
+SQUARE = "0,0 100,0 100,100 0,100"
+TRIANGLE = "0,0 80,0 40,60"
+
+
+def _write_project(directory, name, outlines):
+    with open(os.path.join(directory, f"{name}-Shapes.txt"), 'w') as f:
+        f.write("1000 1000\n" + f"{len(outlines)}\n" + '\n'.join(outlines) + '\n')
+    with open(os.path.join(directory, f"{name}-posiciones.txt"), 'w') as f:
+        f.write(f"{len(outlines)}\n" + ''.join(f"{i} 0 {(i - 1) * 200} 0\n" for i in range(1, len(outlines) + 1)))
+    with open(os.path.join(directory, f"{name}-slices.txt"), 'w') as f:
+        f.write(''.join(f"{i}-1 0 0 1 0 1 1\n" for i in range(1, len(outlines) + 1)))
+
+
+class RunPipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def _run(self, **options):
+        """Runs the batch in a thread so a hang fails the test instead of blocking it."""
+        projects, _ = find_projects([self.directory])
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(
+            run_pipeline(projects, output_dir=self.directory, **options)), daemon=True)
+        thread.start()
+        thread.join(timeout=60)
+        self.assertFalse(thread.is_alive(), "run_pipeline did not return")
+        return result
+
+    def test_failing_project_is_reported_and_batch_finishes(self):
+        _write_project(self.directory, "Good", [SQUARE, TRIANGLE])
+        # A piece with only two vertices has no area and makes the layout stage fail.
+        _write_project(self.directory, "Broken", [SQUARE, "0,0 100,0"])
+        _write_project(self.directory, "Other", [TRIANGLE, SQUARE, TRIANGLE])
+
+        stats = self._run(readers=1, workers=1, queue_size=1)
+
+        self.assertEqual(stats['projects'], 2)
+        self.assertEqual(len(stats['errors']), 1)
+        self.assertTrue(stats['errors'][0].startswith("Broken: "))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "Good-Shapes.pdf")))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "Other-Shapes.pdf")))
+
+    def test_writer_failure_does_not_block_other_stages(self):
+        for index in range(4):
+            _write_project(self.directory, f"Project{index}", [SQUARE, TRIANGLE])
+
+        stats = self._run(readers=2, workers=2, queue_size=1, render_options={'precision': 'invalid'})
+
+        self.assertEqual(stats['projects'], 0)
+        self.assertEqual(len(stats['errors']), 4)
+
+    def test_failed_streaming_render_leaves_no_pdf(self):
+        _write_project(self.directory, "Project", [SQUARE, TRIANGLE])
+
+        stats = self._run(render_options={'precision': 'invalid', 'streaming': True})
+
+        self.assertEqual(len(stats['errors']), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "Project-Shapes.pdf")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,6 +7,7 @@ from reportlab.lib import colors
 from collections import namedtuple
 
 from romans_font import Romans
+from visual_vector_slices import parse_slices_file, build_tag_index, parse_posiciones_file, report_unresolved_tags
 
 from shapely.geometry import Polygon, MultiPolygon, Point
 from shapely.ops import nearest_points
@@ -65,37 +66,6 @@ def parse_problem_file(file_path):
             piece_id_counter += 1
     return bin_dimension, original_pieces_data
 
-def parse_posiciones_file(file_path):
-    bins_data = []
-    with open(file_path, 'r') as f:
-        lines = [line.strip() for line in f.readlines() if line.strip()]
-    line_idx = 0
-    bin_count = 1
-    while line_idx < len(lines):
-        try:
-            num_pieces = int(lines[line_idx])
-            line_idx += 1
-            placed_pieces = []
-            for i in range(num_pieces):
-                if line_idx >= len(lines):
-                    break
-                parts = lines[line_idx].split()
-                if len(parts) < 4:
-                    line_idx += 1
-                    continue
-                piece_id = int(parts[0])
-                rotation = float(parts[1])
-                x = float(parts[2])
-                y = float(parts[3])
-                placed_pieces.append({'id': piece_id, 'rotation': rotation, 'x': x, 'y': y})
-                line_idx += 1
-            if placed_pieces:
-                bins_data.append({'number': bin_count, 'placed_pieces': placed_pieces})
-                bin_count += 1
-        except ValueError:
-            line_idx += 1
-    return bins_data
-
 def rotate_point(point, angle_degrees, center):
     angle_rad = math.radians(angle_degrees)
     cos_theta = math.cos(angle_rad)
@@ -151,13 +121,12 @@ def create_packing_visual_pdf(bins_data, bin_dimension, original_pieces_data, fi
             final_centroid, size = most_inland_point(final_vertices, 10)
             c.setFillColor(colors.red)
             text = str(piece_id)
-            font.scale = size / 80
-            text_width = font.get_string_length(text)
-            paths = font.get_string(text)
+            font_scale = size / 80
+            paths, text_width = font.layout(text, font_scale)
             c.setStrokeColor(colors.red)
             c.setLineWidth(1)
             x_offset = final_centroid[0] - text_width / 2
-            y_offset = final_centroid[1] - 10 * font.scale
+            y_offset = final_centroid[1] - 10 * font_scale
             for path in paths:
                 path_obj = c.beginPath()
                 path_obj.moveTo(path[0][0] + x_offset, path[0][1] + y_offset)
@@ -169,16 +138,30 @@ def create_packing_visual_pdf(bins_data, bin_dimension, original_pieces_data, fi
 
 def main():
     if len(sys.argv) < 3:
-        print("Usage: python visual_vector3.py <shapes_file> <positions_file>")
+        print("Usage: python visual_vector3.py <shapes_file> <positions_file> [slices_file]")
         sys.exit(1)
     shapes_file = sys.argv[1]
     positions_file = sys.argv[2]
+    slices_file = sys.argv[3] if len(sys.argv) > 3 else None
     try:
         bin_dimension, original_pieces_data = parse_problem_file(shapes_file)
     except FileNotFoundError:
         print(f"Error: Shapes file not found at '{shapes_file}'")
         sys.exit(1)
-    bins_data = parse_posiciones_file(positions_file)
+    tag_index = None
+    if slices_file:
+        try:
+            tag_index = build_tag_index(parse_slices_file(slices_file))
+        except FileNotFoundError:
+            print(f"Error: Slices file not found at '{slices_file}'")
+            sys.exit(1)
+    unresolved = []
+    try:
+        bins_data = parse_posiciones_file(positions_file, tag_index, unresolved)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    report_unresolved_tags(unresolved, positions_file)
     if not bins_data:
         print(f"Error: No data found in positions file '{positions_file}'")
         sys.exit(1)
@@ -4,12 +4,17 @@ import random
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
+from reportlab.pdfbase import pdfdoc
+from reportlab import rl_config
 from collections import namedtuple
+import argparse
 import os
+import zlib
 
 from romans_font import Romans
+from streaming_pdf import StreamingCanvas
 
-from shapely.geometry import Polygon, MultiPolygon, Point
+from shapely.geometry import Polygon, MultiPolygon, MultiPoint, Point
 from shapely.ops import nearest_points
 import numpy as np
 
@@ -120,38 +125,106 @@ def parse_slices_file(file_path):
                 labels.append(line.split(' ')[0])
     return labels
 
-def parse_posiciones_file(file_path):
-    """Parses the positions file to get the placement of each piece."""
-    bins_data = []
+def build_tag_index(labels):
+    """Maps every slice tag to its (1-based piece index, label).
+
+    The index is built once from the labels returned by parse_slices_file so
+    tagged posiciones files resolve each placement with a single dict lookup.
+    When a tag repeats, the first slice carrying it wins.
+    """
+    tag_index = {}
+    for piece_index, label in enumerate(labels, start=1):
+        tag_index.setdefault(label, (piece_index, label))
+    return tag_index
+
+def _is_int(token):
+    try:
+        int(token)
+        return True
+    except ValueError:
+        return False
+
+def is_tagged_posiciones(lines):
+    """Tells whether posiciones lines identify pieces by slice tag instead of line number."""
+    return any(len(parts) >= 4 and not _is_int(parts[0]) for parts in (line.split() for line in lines))
+
+def read_posiciones_lines(file_path):
+    """Returns the non-blank, stripped lines of a posiciones file."""
     with open(file_path, 'r') as f:
-        lines = [line.strip() for line in f.readlines() if line.strip()]
+        return [line.strip() for line in f.readlines() if line.strip()]
+
+def parse_posiciones_file(file_path, tag_index=None, unresolved=None):
+    """Parses the positions file to get the placement of each piece.
+
+    Both the numeric format and the tagged variant (`posiciones-tagged.txt`,
+    where column 1 is the slice tag) are accepted; the format is detected
+    from the file itself. Tags are resolved through `tag_index` (see
+    build_tag_index) and placements whose tag is unknown are skipped.
+
+    Args:
+        file_path: Path of the posiciones file.
+        tag_index: Tag to (piece index, label) mapping, required for tagged files.
+        unresolved: Optional list that receives the tags that could not be resolved.
+
+    Returns:
+        A list of bins, each a dict with its 'number' and 'placed_pieces'.
+    """
+    return parse_posiciones_lines(read_posiciones_lines(file_path), tag_index, unresolved, file_path)
+
+def parse_posiciones_lines(lines, tag_index=None, unresolved=None, file_path="posiciones file"):
+    """Parses lines already read with read_posiciones_lines (see parse_posiciones_file).
+
+    Callers that also need the lines, e.g. to tell the format with
+    is_tagged_posiciones, use it to read the file only once; `file_path`
+    only names the file in errors.
+    """
+    bins_data = []
+    tagged = is_tagged_posiciones(lines)
+    if tagged and tag_index is None:
+        raise ValueError(f"'{file_path}' identifies pieces by tag; a slices file is needed to resolve them")
     line_idx = 0
     bin_count = 1
     while line_idx < len(lines):
         try:
             num_pieces = int(lines[line_idx])
+        except ValueError:
             line_idx += 1
-            placed_pieces = []
-            for i in range(num_pieces):
-                if line_idx >= len(lines):
-                    break
-                parts = lines[line_idx].split()
-                if len(parts) < 4:
-                    line_idx += 1
-                    continue
-                piece_id = int(parts[0])
+            continue
+        line_idx += 1
+        placed_pieces = []
+        for i in range(num_pieces):
+            if line_idx >= len(lines):
+                break
+            parts = lines[line_idx].split()
+            line_idx += 1
+            if len(parts) < 4:
+                continue
+            try:
+                if tagged:
+                    if parts[0] not in tag_index:
+                        if unresolved is not None:
+                            unresolved.append(parts[0])
+                        continue
+                    piece_id = tag_index[parts[0]][0]
+                else:
+                    piece_id = int(parts[0])
                 rotation = float(parts[1])
                 x = float(parts[2])
                 y = float(parts[3])
-                placed_pieces.append({'id': piece_id, 'rotation': rotation, 'x': x, 'y': y})
-                line_idx += 1
-            if placed_pieces:
-                bins_data.append({'number': bin_count, 'placed_pieces': placed_pieces})
-                bin_count += 1
-        except ValueError:
-            line_idx += 1
+            except ValueError:
+                continue
+            placed_pieces.append({'id': piece_id, 'rotation': rotation, 'x': x, 'y': y})
+        if placed_pieces:
+            bins_data.append({'number': bin_count, 'placed_pieces': placed_pieces})
+            bin_count += 1
     return bins_data
 
+def report_unresolved_tags(unresolved, positions_file):
+    """Prints the tags of a posiciones file that are missing from the slices file."""
+    if unresolved:
+        print(f"Warning: {len(unresolved)} placements in '{positions_file}' use tags not found in the slices file: "
+              f"{', '.join(sorted(set(unresolved)))}")
+
 def rotate_point(point, angle_degrees, center):
     """Rotates a point counterclockwise by a given angle around a given center."""
     angle_rad = math.radians(angle_degrees)
@@ -163,166 +236,416 @@ def rotate_point(point, angle_degrees, center):
     new_y = sin_theta * (x - cx) + cos_theta * (y - cy) + cy
     return new_x, new_y
 
-def create_packing_visual_pdf(bins_data, bin_dimension, original_pieces_data, labels, file_name="output.pdf"):
-    """Creates the PDF visualization of the packed pieces."""
-    c = canvas.Canvas(file_name, pagesize=(bin_dimension.width, bin_dimension.height))
-    font = Romans()
-    # Set a uniform light gray color with 30% transparency for all parts
-    fill_color = colors.Color(0.9, 0.9, 0.9, alpha=0.7)
+def quantize_vertices(vertices, precision):
+    """Snaps vertices to a grid of `precision` units, dropping repeated points.
+
+    Page units are millimetres, so a precision of 0.01 keeps the output
+    visually identical at cutting scale while shortening every coordinate
+    written to the page stream.
+
+    Args:
+        vertices: A list of (x, y) tuples.
+        precision: The grid size; None or 0 returns the vertices unchanged.
+
+    Returns:
+        A list of (x, y) tuples with consecutive duplicates removed.
+    """
+    if not precision:
+        return vertices
+    quantized = []
+    for x, y in vertices:
+        point = (round(x / precision) * precision, round(y / precision) * precision)
+        if not quantized or point != quantized[-1]:
+            quantized.append(point)
+    return quantized
+
+class _LeveledZCompress(pdfdoc.PDFStreamFilterZCompress):
+    """FlateDecode filter that compresses at a fixed zlib level."""
+    def __init__(self, level):
+        self.level = level
+
+    def encode(self, text):
+        if isinstance(text, str):
+            text = text.encode('utf8')
+        return zlib.compress(text, self.level)
+
+def page_stream_size(c, compression_level):
+    """Returns the raw and compressed byte size of the current page stream.
+
+    The page is compressed once more just to measure it, so the renderers
+    only call this when sizes are asked for.
+    """
+    raw = ('\n'.join(c._code) + '\n').encode('utf8')
+    compressed = zlib.compress(raw, compression_level) if compression_level else raw
+    return len(raw), len(compressed)
+
+def place_piece(original_vertices, rotation_pivot, piece_info):
+    """Returns the vertices of a piece rotated and moved to its placement on the sheet."""
+    rotation_angle = piece_info['rotation']
+
+    # 1. Rotate the shape around its original bottom-left corner (the pivot)
+    rotated_vertices = [rotate_point(p, rotation_angle, rotation_pivot) for p in original_vertices]
+
+    # 2. Get the bounding box of the *rotated* shape
+    rotated_min_x, rotated_min_y, _, _ = get_polygon_bbox(rotated_vertices)
+
+    # 3. Get the final placement coordinates from the file
+    final_placed_x = piece_info['x']
+    final_placed_y = piece_info['y']
+
+    # 4. Calculate the translation needed to move the rotated shape's bbox-min to the final placement coords
+    translation_x = final_placed_x - rotated_min_x
+    translation_y = final_placed_y - rotated_min_y
+
+    # 5. Apply the final translation
+    return [(p[0] + translation_x, p[1] + translation_y) for p in rotated_vertices]
+
+def mirror_frame(points, width):
+    """Reflects pivot-relative points about the vertical axis of the piece's bbox (x -> width - x)."""
+    return [(width - x, y) for x, y in points]
+
+def _piece_variant(variants, original_pieces_data, representative, mirrored, rotation):
+    """Returns a piece's outline and label anchor rotated, with its bbox-min at the origin.
+
+    Variants are cached per (representative, mirrored, rotation), and the
+    label anchor per representative, so copies of a shape only pay for the
+    final translation.
+    """
+    key = (representative, mirrored, rotation)
+    if key in variants:
+        return variants[key]
+    if representative not in variants:
+        original_vertices, (pivot_x, pivot_y) = original_pieces_data[representative]
+        local_vertices = [(x - pivot_x, y - pivot_y) for x, y in original_vertices]
+        variants[representative] = (local_vertices,) + most_inland_point(local_vertices, 10)
+    local_vertices, label_point, size = variants[representative]
+    if mirrored:
+        width = max(x for x, _ in local_vertices)
+        local_vertices = mirror_frame(local_vertices, width)
+        label_point = mirror_frame([label_point], width)[0]
+    origin = (0, 0)
+    rotated_vertices = [rotate_point(p, rotation, origin) for p in local_vertices]
+    rotated_label_point = rotate_point(label_point, rotation, origin)
+    min_x, min_y, _, _ = get_polygon_bbox(rotated_vertices)
+    variants[key] = ([(x - min_x, y - min_y) for x, y in rotated_vertices],
+                     (rotated_label_point[0] - min_x, rotated_label_point[1] - min_y), size)
+    return variants[key]
+
+def layout_bins(bins_data, original_pieces_data, labels, piece_groups=None):
+    """Computes the placed geometry and label anchors of every bin.
+
+    This is the CPU-heavy half of the rendering: it does not touch the
+    canvas, so it can run ahead of (or in parallel with) the PDF writer.
+    Label anchors are searched once per shape in the piece's own frame and
+    each rotation is computed once, then moved to every placement.
+
+    Args:
+        piece_groups: Optional mapping from piece id to (representative_id,
+            is_mirrored) as returned by duplicates.group_pieces; copies of a
+            shape then share the representative's work.
+
+    Returns:
+        A list with one list per bin of dicts holding the piece 'id', its
+        'label', the placed 'vertices', and the 'label_point' and 'label_size'
+        found by most_inland_point.
+    """
+    return list(iter_layouts(bins_data, original_pieces_data, labels, piece_groups))
+
+def iter_layouts(bins_data, original_pieces_data, labels, piece_groups=None):
+    """Yields the layout_bins result one bin at a time, so only one bin's geometry is held at once."""
+    variants = {}
     for bin_info in bins_data:
-        c.setPageSize((bin_dimension.width, bin_dimension.height))
-        c.setStrokeColor(colors.blue)
-        c.rect(0, 0, bin_dimension.width, bin_dimension.height)
+        placed = []
         for piece_info in bin_info['placed_pieces']:
             piece_id = piece_info['id']
             if piece_id not in original_pieces_data:
                 continue
-            
-            original_vertices, rotation_pivot = original_pieces_data[piece_id]
-            rotation_angle = piece_info['rotation']
-
-            # 1. Rotate the shape around its original bottom-left corner (the pivot)
-            rotated_vertices = [rotate_point(p, rotation_angle, rotation_pivot) for p in original_vertices]
-
-            # 2. Get the bounding box of the *rotated* shape
-            rotated_min_x, rotated_min_y, _, _ = get_polygon_bbox(rotated_vertices)
-            
-            # 3. Get the final placement coordinates from the file
-            final_placed_x = piece_info['x']
-            final_placed_y = piece_info['y']
-
-            # 4. Calculate the translation needed to move the rotated shape's bbox-min to the final placement coords
-            translation_x = final_placed_x - rotated_min_x
-            translation_y = final_placed_y - rotated_min_y
-            
-            # 5. Apply the final translation
-            final_vertices = [(p[0] + translation_x, p[1] + translation_y) for p in rotated_vertices]
-
-            p = c.beginPath()
-            p.moveTo(final_vertices[0][0], final_vertices[0][1])
-            for point in final_vertices[1:]:
-                p.lineTo(point[0], point[1])
-            p.close()
-            c.setFillColor(fill_color)
+            representative, mirrored = piece_groups.get(piece_id, (piece_id, False)) if piece_groups \
+                else (piece_id, False)
+            vertices, label_point, size = _piece_variant(variants, original_pieces_data, representative, mirrored,
+                                                         piece_info['rotation'])
+            x, y = piece_info['x'], piece_info['y']
+            final_vertices = [(vx + x, vy + y) for vx, vy in vertices]
+            label = labels[piece_id - 1] if 0 <= (piece_id - 1) < len(labels) else str(piece_id)
+            placed.append({'id': piece_id, 'label': label, 'vertices': final_vertices,
+                           'label_point': (label_point[0] + x, label_point[1] + y), 'label_size': size})
+        yield placed
+
+def draw_strokes(c, strokes, x_offset, y_offset, precision=None):
+    """Strokes the paths returned by Romans.layout, shifted by the given offsets."""
+    for stroke in strokes:
+        path = quantize_vertices([(x + x_offset, y + y_offset) for x, y in stroke.tolist()], precision)
+        path_obj = c.beginPath()
+        path_obj.moveTo(path[0][0], path[0][1])
+        for point in path[1:]:
+            path_obj.lineTo(point[0], point[1])
+        c.drawPath(path_obj)
+
+def label_strokes(font, label, label_point, size):
+    """Lays out a piece label in the Romans font centred on `label_point`.
+
+    A label containing '-' or ')' is split after its block id: the block id
+    is drawn large in red and the rest half size after it, in black on a
+    raised baseline for labels with ')' (e.g. "16-3-A)") and in green
+    otherwise (e.g. "51-2").
+
+    Returns:
+        A list of (color, strokes, x_offset, y_offset) runs, where strokes
+        are the paths of Romans.layout.
+    """
+    main_font_scale = size / 80
+    secondary_font_scale = main_font_scale * 0.5
+
+    # Standard label (no hyphens)
+    if ')' not in label and '-' not in label:
+        paths, text_width = font.layout(label, main_font_scale)
+        return [(colors.red, paths, label_point[0] - text_width / 2, label_point[1] - 10 * main_font_scale)]
+
+    if ')' in label:
+        parts = label.replace(')', '').split('-', 1)
+    else:
+        parts = label.split('-', 1)
+    main_text = parts[0]
+    secondary_text = parts[1].replace('-', '') if len(parts) > 1 else ''
+    main_paths, main_width = font.layout(main_text, main_font_scale)
+    secondary_paths, secondary_width = font.layout(secondary_text, secondary_font_scale)
+
+    total_width = main_width + secondary_width
+    x_offset = label_point[0] - total_width / 2
+    y_offset = label_point[1] - 10 * main_font_scale
+    runs = [(colors.red, main_paths, x_offset, y_offset)]
+    if ')' in label:
+        # Raise the baseline of the secondary text to the middle of the main text (black)
+        runs.append((colors.black, secondary_paths, x_offset + main_width, y_offset + (50 * main_font_scale) * 0.2))
+    else:
+        runs.append((colors.green, secondary_paths, x_offset + main_width, y_offset))
+    return runs
+
+def draw_label(c, font, label, label_point, size, precision=None):
+    """Draws a piece label in the Romans font centred on `label_point` (see label_strokes).
+
+    The font is only used through its stateless layout, so one instance can
+    be shared by renderers running in several threads.
+    """
+    c.setLineWidth(1)
+    for color, strokes, x_offset, y_offset in label_strokes(font, label, label_point, size):
+        c.setStrokeColor(color)
+        draw_strokes(c, strokes, x_offset, y_offset, precision)
+
+def open_canvas(file_name, bin_dimension, compression_level=6, streaming=False):
+    """Returns a reportlab Canvas, or a StreamingCanvas writing each page as it is finished.
+
+    reportlab's own page compression goes through the module-wide
+    pdfdoc.PDFZCompress filter at zlib's default level. It is left off here;
+    instead the chosen level becomes the default filter of this canvas's
+    document (behind ASCII85 when rl_config.useA85 asks for it, as reportlab
+    does), which reportlab applies to every stream without filters of its
+    own. Documents written by other threads are not affected.
+    """
+    pagesize = (bin_dimension.width, bin_dimension.height)
+    if streaming:
+        return StreamingCanvas(file_name, pagesize=pagesize, compression_level=compression_level)
+    c = canvas.Canvas(file_name, pagesize=pagesize, pageCompression=0)
+    if compression_level:
+        zcompress = _LeveledZCompress(compression_level)
+        c._doc.defaultStreamFilters = [pdfdoc.PDFBase85Encode, zcompress] if rl_config.useA85 else [zcompress]
+    return c
+
+def discard_canvas(c, file_name):
+    """Closes a canvas whose render failed and deletes its unfinished file.
+
+    A StreamingCanvas has already written the pages drawn so far; they are
+    deleted too rather than left at the output path looking like a finished
+    document (recover_pdf is for files whose process was killed).
+    """
+    if isinstance(c, StreamingCanvas):
+        c.close()
+    if os.path.exists(file_name):
+        os.remove(file_name)
+
+def render_layout_pdf(page_layouts, bin_dimension, file_name="output.pdf", precision=0.01, compression_level=6,
+                      streaming=False, report_sizes=False):
+    """Writes the bins produced by layout_bins to a PDF, one page per bin.
+
+    If drawing or saving raises, the unfinished file is removed (see
+    discard_canvas) before the exception propagates.
+
+    Args:
+        precision: Grid size in mm that coordinates are rounded to before
+            being written; None writes full float precision.
+        compression_level: zlib level (0-9) for the page streams; 0 disables
+            page compression.
+        streaming: Write every page to disk as soon as it is drawn (see
+            StreamingCanvas) instead of keeping the document in memory.
+        report_sizes: Measure the page streams (see page_stream_size).
+
+    Returns:
+        A list with one (raw_bytes, compressed_bytes) tuple per page, empty
+        unless `report_sizes` is set.
+    """
+    c = open_canvas(file_name, bin_dimension, compression_level, streaming)
+    page_sizes = []
+    try:
+        font = Romans()
+        # Set a uniform light gray color with 30% transparency for all parts
+        fill_color = colors.Color(0.9, 0.9, 0.9, alpha=0.7)
+        for placed in page_layouts:
+            c.setPageSize((bin_dimension.width, bin_dimension.height))
+            c.setStrokeColor(colors.blue)
+            c.rect(0, 0, bin_dimension.width, bin_dimension.height)
+            for piece in placed:
+                outline = quantize_vertices(piece['vertices'], precision)
+
+                p = c.beginPath()
+                p.moveTo(outline[0][0], outline[0][1])
+                for point in outline[1:]:
+                    p.lineTo(point[0], point[1])
+                p.close()
+                c.setFillColor(fill_color)
+                c.setStrokeColor(colors.blue)
+                c.setLineWidth(0.5)
+                c.drawPath(p, fill=1, stroke=1)
+                draw_label(c, font, piece['label'], piece['label_point'], piece['label_size'], precision)
+            if report_sizes:
+                page_sizes.append(page_stream_size(c, compression_level))
+            c.showPage();
+        c.save();
+    except BaseException:
+        discard_canvas(c, file_name)
+        raise
+    return page_sizes
+
+def create_packing_visual_pdf(bins_data, bin_dimension, original_pieces_data, labels, file_name="output.pdf",
+                              precision=0.01, compression_level=6, piece_groups=None, streaming=False,
+                              report_sizes=False):
+    """Creates the PDF visualization of the packed pieces.
+
+    See layout_bins for `piece_groups` and render_layout_pdf for the output
+    options and the return value.
+    """
+    page_layouts = iter_layouts(bins_data, original_pieces_data, labels, piece_groups)
+    return render_layout_pdf(page_layouts, bin_dimension, file_name=file_name, precision=precision,
+                             compression_level=compression_level, streaming=streaming, report_sizes=report_sizes)
+
+def piece_frame(original_vertices, rotation_pivot):
+    """Returns a piece's vertices relative to its pivot and the convex hull of them.
+
+    The hull is all that is needed to find the bbox of the rotated piece, so
+    placements can be computed without touching every vertex.
+    """
+    local_vertices = [(x - rotation_pivot[0], y - rotation_pivot[1]) for x, y in original_vertices]
+    hull = np.asarray(MultiPoint(local_vertices).convex_hull.exterior.coords
+                      if len(local_vertices) > 2 else local_vertices, dtype=float).reshape(-1, 2)
+    return local_vertices, hull
+
+def placement_transform(hull, piece_info):
+    """Returns (cos, sin, tx, ty) mapping pivot-relative coordinates onto the sheet.
+
+    It is the transform applied by place_piece: rotate around the pivot, then
+    move the bbox-min of the rotated piece to the placement coordinates.
+    """
+    angle_rad = math.radians(piece_info['rotation'])
+    cos_theta = math.cos(angle_rad)
+    sin_theta = math.sin(angle_rad)
+    rotated_min_x = (cos_theta * hull[:, 0] - sin_theta * hull[:, 1]).min()
+    rotated_min_y = (sin_theta * hull[:, 0] + cos_theta * hull[:, 1]).min()
+    return cos_theta, sin_theta, piece_info['x'] - rotated_min_x, piece_info['y'] - rotated_min_y
+
+def render_forms_pdf(bins_data, bin_dimension, original_pieces_data, labels, file_name="output.pdf",
+                     precision=0.01, compression_level=6, piece_groups=None, streaming=False, report_sizes=False):
+    """Creates the PDF visualization placing each piece as a Form XObject.
+
+    Every distinct piece outline is written once, in its own frame, and each
+    placement is a `Do` of that form under a rotate/translate CTM, so Python
+    does no per-vertex work per placement. Label anchors are also searched
+    once per piece and moved with the same transform. With `piece_groups`
+    (see layout_bins) copies of a shape share one form, mirror images
+    through an extra x -> width - x reflection.
+
+    See render_layout_pdf for the output options and the return value.
+    """
+    c = open_canvas(file_name, bin_dimension, compression_level, streaming)
+    page_sizes = []
+    try:
+        font = Romans()
+        fill_color = colors.Color(0.9, 0.9, 0.9, alpha=0.7)
+        forms = {}
+        for bin_info in bins_data:
+            c.setPageSize((bin_dimension.width, bin_dimension.height))
             c.setStrokeColor(colors.blue)
-            c.setLineWidth(0.5)
-            c.drawPath(p, fill=1, stroke=1)
-            
-            # --- Label Rendering Logic ---
-            final_centroid, size = most_inland_point(final_vertices, 10);
-            c.setLineWidth(1);
-
-            label = labels[piece_id - 1] if 0 <= (piece_id - 1) < len(labels) else str(piece_id);
-            main_font_scale = size / 80;
-            secondary_font_scale = main_font_scale * 0.5;
-
-            # Case 1: Label ends with ')' (e.g., "16-3-A)")
-            if ')' in label:
-                label_part = label.replace(')', '');
-                parts = label_part.split('-', 1);
-                main_text = parts[0];
-                secondary_text = parts[1].replace('-', '') if len(parts) > 1 else '';
-
-                # Main part of the label (large, red)
-                font.scale = main_font_scale;
-                main_width = font.get_string_length(main_text);
-                main_paths = font.get_string(main_text);
-                
-                # Secondary part of the label (smaller, black)
-                font.scale = secondary_font_scale;
-                secondary_width = font.get_string_length(secondary_text);
-                secondary_paths = font.get_string(secondary_text);
-
-                total_width = main_width + secondary_width;
-                x_offset = final_centroid[0] - total_width / 2;
-                y_offset = final_centroid[1] - 10 * main_font_scale;
-
-                c.setStrokeColor(colors.red);
-                font.scale = main_font_scale;
-                for path in main_paths:
-                    path_obj = c.beginPath();
-                    path_obj.moveTo(path[0][0] + x_offset, path[0][1] + y_offset);
-                    for point in path[1:]:
-                        path_obj.lineTo(point[0] + x_offset, point[1] + y_offset);
-                    c.drawPath(path_obj);
-
-                x_offset += main_width;
-                # Raise the baseline of the secondary text to the middle of the main text
-                y_offset_secondary = y_offset + (50 * main_font_scale) * 0.2 # Adjusted for better vertical alignment
-
-                c.setStrokeColor(colors.black);
-                font.scale = secondary_font_scale;
-                for path in secondary_paths:
-                    path_obj = c.beginPath();
-                    path_obj.moveTo(path[0][0] + x_offset, path[0][1] + y_offset_secondary);
-                    for point in path[1:]:
-                        path_obj.lineTo(point[0] + x_offset, point[1] + y_offset_secondary);
-                    c.drawPath(path_obj);
-
-            # Case 2: Label contains '-' but not ')' (e.g., "51-2" or "5-2-A")
-            elif '-' in label:
-                parts = label.split('-', 1);
-                main_text = parts[0];
-                secondary_text = parts[1].replace('-', '');
-
-                # Main part of the label (large, red)
-                font.scale = main_font_scale;
-                main_width = font.get_string_length(main_text);
-                main_paths = font.get_string(main_text);
-
-                # Secondary part of the label (smaller, green)
-                font.scale = secondary_font_scale;
-                secondary_width = font.get_string_length(secondary_text);
-                secondary_paths = font.get_string(secondary_text);
-
-                total_width = main_width + secondary_width;
-                x_offset = final_centroid[0] - total_width / 2;
-                y_offset = final_centroid[1] - 10 * main_font_scale;
-
-                c.setStrokeColor(colors.red);
-                font.scale = main_font_scale;
-                for path in main_paths:
-                    path_obj = c.beginPath();
-                    path_obj.moveTo(path[0][0] + x_offset, path[0][1] + y_offset);
-                    for point in path[1:]:
-                        path_obj.lineTo(point[0] + x_offset, point[1] + y_offset);
-                    c.drawPath(path_obj);
-
-                x_offset += main_width;
-                c.setStrokeColor(colors.green);
-                font.scale = secondary_font_scale;
-                for path in secondary_paths:
-                    path_obj = c.beginPath();
-                    path_obj.moveTo(path[0][0] + x_offset, path[0][1] + y_offset);
-                    for point in path[1:]:
-                        path_obj.lineTo(point[0] + x_offset, point[1] + y_offset);
-                    c.drawPath(path_obj);
-
-            # Case 3: Standard label (no hyphens)
-            else:
-                c.setStrokeColor(colors.red);
-                font.scale = main_font_scale;
-                text_width = font.get_string_length(label);
-                paths = font.get_string(label);
-                x_offset = final_centroid[0] - text_width / 2;
-                y_offset = final_centroid[1] - 10 * font.scale;
-                for path in paths:
-                    path_obj = c.beginPath();
-                    path_obj.moveTo(path[0][0] + x_offset, path[0][1] + y_offset);
-                    for point in path[1:]:
-                        path_obj.lineTo(point[0] + x_offset, point[1] + y_offset);
-                    c.drawPath(path_obj);
-        c.showPage();
-    c.save();
+            c.rect(0, 0, bin_dimension.width, bin_dimension.height)
+            for piece_info in bin_info['placed_pieces']:
+                piece_id = piece_info['id']
+                if piece_id not in original_pieces_data:
+                    continue
+                representative, mirrored = piece_groups.get(piece_id, (piece_id, False)) if piece_groups \
+                    else (piece_id, False)
+                if representative not in forms:
+                    local_vertices, hull = piece_frame(*original_pieces_data[representative])
+                    outline = quantize_vertices(local_vertices, precision)
+                    form_name = f"piece{representative}"
+                    c.beginForm(form_name)
+                    p = c.beginPath()
+                    p.moveTo(outline[0][0], outline[0][1])
+                    for point in outline[1:]:
+                        p.lineTo(point[0], point[1])
+                    p.close()
+                    c.drawPath(p, fill=1, stroke=1)
+                    c.endForm()
+                    label_point, size = most_inland_point(local_vertices, 10)
+                    forms[representative] = (form_name, hull, label_point, size)
+                form_name, hull, label_point, size = forms[representative]
+                if mirrored:
+                    width = hull[:, 0].max()
+                    hull = np.column_stack([width - hull[:, 0], hull[:, 1]])
+                    label_point = (width - label_point[0], label_point[1])
+                cos_theta, sin_theta, tx, ty = placement_transform(hull, piece_info)
+
+                c.saveState()
+                c.setFillColor(fill_color)
+                c.setStrokeColor(colors.blue)
+                c.setLineWidth(0.5)
+                c.transform(cos_theta, sin_theta, -sin_theta, cos_theta, tx, ty)
+                if mirrored:
+                    c.transform(-1, 0, 0, 1, width, 0)
+                c.doForm(form_name)
+                c.restoreState()
+
+                label = labels[piece_id - 1] if 0 <= (piece_id - 1) < len(labels) else str(piece_id)
+                placed_label_point = (cos_theta * label_point[0] - sin_theta * label_point[1] + tx,
+                                      sin_theta * label_point[0] + cos_theta * label_point[1] + ty)
+                draw_label(c, font, label, placed_label_point, size, precision)
+            if report_sizes:
+                page_sizes.append(page_stream_size(c, compression_level))
+            c.showPage()
+        c.save()
+    except BaseException:
+        discard_canvas(c, file_name)
+        raise
+    return page_sizes
 
 def main():
     """Main function to parse input files and generate the PDF."""
-    if len(sys.argv) < 4:
-        print("Usage: python visual_vector_slices.py <shapes_file> <positions_file> <slices_file>")
-        sys.exit(1)
-    shapes_file = sys.argv[1]
-    positions_file = sys.argv[2]
-    slices_file = sys.argv[3]
+    parser = argparse.ArgumentParser(description="Render a nesting solution as a vector PDF.")
+    parser.add_argument("shapes_file")
+    parser.add_argument("positions_file")
+    parser.add_argument("slices_file")
+    parser.add_argument("--precision", type=float, default=0.01,
+                        help="coordinate grid in mm, e.g. 0.01 or 0.1; 0 keeps full precision (default: 0.01)")
+    parser.add_argument("--compression", type=int, default=6, choices=range(10), metavar="0-9",
+                        help="zlib level for page streams, 0 disables compression (default: 6)")
+    parser.add_argument("--report-sizes", action="store_true",
+                        help="print the byte size of every page stream")
+    parser.add_argument("--forms", action="store_true",
+                        help="write each piece once as a PDF form and place it with a transform")
+    parser.add_argument("--streaming", action="store_true",
+                        help="write each page to disk as soon as it is drawn, keeping memory flat")
+    parser.add_argument("--keep-duplicates", action="store_true",
+                        help="process every piece on its own instead of once per distinct outline")
+    args = parser.parse_args()
+    shapes_file = args.shapes_file
+    positions_file = args.positions_file
+    slices_file = args.slices_file
     try:
         bin_dimension, original_pieces_data = parse_problem_file(shapes_file)
     except FileNotFoundError:
@@ -333,7 +656,13 @@ def main():
     except FileNotFoundError:
         print(f"Error: Slices file not found at '{slices_file}'")
         sys.exit(1)
-    bins_data = parse_posiciones_file(positions_file)
+    unresolved = []
+    try:
+        bins_data = parse_posiciones_file(positions_file, build_tag_index(labels), unresolved)
+    except FileNotFoundError:
+        print(f"Error: Positions file not found at '{positions_file}'")
+        sys.exit(1)
+    report_unresolved_tags(unresolved, positions_file)
     if not bins_data:
         print(f"Error: No data found in positions file '{positions_file}'")
         sys.exit(1)
@@ -342,8 +671,23 @@ def main():
     base_name = os.path.splitext(os.path.basename(shapes_file))[0]
     output_filename = f"{base_name}.pdf"
     
-    create_packing_visual_pdf(bins_data, bin_dimension, original_pieces_data, labels, file_name=output_filename)
-    print(f"PDF saved to {output_filename}")
+    piece_groups = None
+    if not args.keep_duplicates:
+        # duplicates imports this module, so it is only loaded when needed.
+        from duplicates import group_pieces, unique_shapes
+        piece_groups = group_pieces(original_pieces_data)
+        print(f"{len(unique_shapes(piece_groups))} unique shapes among {len(original_pieces_data)} pieces")
+
+    render = render_forms_pdf if args.forms else create_packing_visual_pdf
+    page_sizes = render(bins_data, bin_dimension, original_pieces_data, labels,
+                        file_name=output_filename, precision=args.precision or None,
+                        compression_level=args.compression, piece_groups=piece_groups, streaming=args.streaming,
+                        report_sizes=args.report_sizes)
+    if args.report_sizes:
+        for page_number, (raw_size, compressed_size) in enumerate(page_sizes, start=1):
+            print(f"  Page {page_number}: {raw_size} bytes raw, {compressed_size} bytes compressed")
+        print(f"  Total page streams: {sum(size for _, size in page_sizes)} bytes")
+    print(f"PDF saved to {output_filename} ({os.path.getsize(output_filename)} bytes)")
 
 if __name__ == "__main__":
     main()
@@ -12,9 +12,17 @@ import zipfile
 
 from romans_font import Romans
 
+# The parsing and drawing helpers shared with the other tools live in build_me_up_changes.
+# That directory is not a package: its modules import each other by top-level
+# name (romans_font, streaming_pdf, ...), so it has to be on sys.path itself.
+# It goes first so that no other visual_vector_slices or duplicates shadows it.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'build_me_up_changes'))
+from visual_vector_slices import build_tag_index, is_tagged_posiciones, draw_label
+from duplicates import shape_key
+
 from polylabel import polylabel
 
-from shapely.geometry import Polygon, MultiPolygon, Point, LineString
+from shapely.geometry import Polygon, MultiPolygon, MultiPoint, Point, LineString
 from shapely.ops import nearest_points
 import numpy as np
 
@@ -31,16 +39,24 @@ def get_polygon_bbox(points):
     max_y = max(p[1] for p in points)
     return min_x, min_y, max_x, max_y
 
-def parse_posiciones_file(f):
-    """Parses the positions file from a file-like object."""
+def parse_posiciones_file(f, tag_index, unresolved=None):
+    """Parses the positions file from a file-like object.
+
+    Numeric files (column 1 is the 1-based line number in slices.txt) and
+    tagged files (column 1 is the slice tag) are both accepted; the format is
+    detected from the file and every placement is resolved to its slice name
+    through `tag_index`. Unresolved identifiers are appended to `unresolved`.
+    """
     bins_data = []
     lines = [line.strip() for line in f.readlines() if line.strip()]
+    rows = [line.split() for line in lines]
+    tagged = is_tagged_posiciones(lines)
+    names_by_index = None if tagged else {index: name for name, (index, _) in tag_index.items()}
     
     current_bin_pieces = []
     bin_count = 1
 
-    for line in lines:
-        parts = line.split()
+    for parts in rows:
         is_header = False
         if len(parts) == 1:
             try:
@@ -57,7 +73,14 @@ def parse_posiciones_file(f):
         else:
             if len(parts) >= 4:
                 try:
-                    piece_name = parts[0]
+                    if tagged:
+                        piece_name = parts[0] if parts[0] in tag_index else None
+                    else:
+                        piece_name = names_by_index.get(int(parts[0]))
+                    if piece_name is None:
+                        if unresolved is not None:
+                            unresolved.append(parts[0])
+                        continue
                     rotation = float(parts[1])
                     x = float(parts[2])
                     y = float(parts[3])
@@ -81,14 +104,22 @@ def rotate_point(point, angle_degrees, center):
     new_y = sin_theta * (x - cx) + cos_theta * (y - cy) + cy
     return new_x, new_y
 
-def parse_and_transform_slices(f):
-    """Parses slices.txt from a file-like object, groups by block, flips, and returns transformed data."""
+def parse_and_transform_slices(f, flip=True):
+    """Parses slices.txt from a file-like object, groups by block, flips, and returns transformed data.
+
+    The tag index used to resolve posiciones files is built from the same
+    lines with build_tag_index, so it maps each slice tag to its (1-based
+    line number, label) exactly as visual_vector_slices does. Slices already
+    moved into the Shapes frame (see build_me_up_changes/registration.py)
+    are read with `flip=False`.
+    """
     lines = f.readlines()
     
     first_line = lines[0].strip() if lines else ""
     first_tag = first_line.split(' ')[0] if first_line else "output"
 
     blocks = {}
+    tag_index = build_tag_index([line.split()[0] for line in lines if line.split()])
     
     for line in lines:
         parts = line.strip().split()
@@ -131,14 +162,14 @@ def parse_and_transform_slices(f):
             name = info['name']
             original_poly = info['poly']
             
-            flipped_polygon = [(x_max - x, y) for x, y in original_poly]
+            flipped_polygon = [(x_max - x, y) for x, y in original_poly] if flip else original_poly
             
             min_x, min_y, _, _ = get_polygon_bbox(flipped_polygon)
             pivot = (min_x, min_y)
             
             transformed_pieces_data[name] = (flipped_polygon, pivot, name)
 
-    return transformed_pieces_data, first_tag
+    return transformed_pieces_data, first_tag, tag_index
 
     blocks = {}
     
@@ -193,8 +224,90 @@ def parse_and_transform_slices(f):
 
     return transformed_pieces_data, first_tag
 
-def create_packing_visual_pdf(bins_data, transformed_pieces_data, file_name="output.pdf"):
-    """Creates the PDF visualization of the packed pieces."""
+def _label_anchor(vertices):
+    """Returns the polylabel point of an outline and twice its distance to the boundary."""
+    polygon = Polygon(vertices)
+    if not polygon.is_valid:
+        polygon = polygon.buffer(0)
+    if polygon.is_empty:
+        return Point(0, 0), 0
+    if polygon.geom_type == 'MultiPolygon':
+        polygon = max(polygon.geoms, key=lambda p: p.area)
+    label_point = Point(polylabel([list(polygon.exterior.coords)]))
+    return label_point, label_point.distance(polygon.boundary) * 2
+
+def draw_bin_with_forms(c, font, bin_info, transformed_pieces_data, forms, fill_color, bin_height, margin):
+    """Draws one bin placing each piece as a Form XObject.
+
+    Each distinct outline is written once in its pivot-relative frame and
+    placed with a rotate/translate CTM; slices that are copies of one
+    another, or mirror images, share the form and its label anchor. The landscape-to-portrait swap is a
+    single page transform around all placements, so no vertex is transformed
+    in Python. Labels stay upright and are drawn in page coordinates.
+    """
+    labels_to_draw = []
+    c.saveState()
+    # (x, y) on the landscape sheet -> (bin_height - y + margin, x + margin) on the portrait page
+    c.transform(0, 1, -1, 0, bin_height + margin, margin)
+    for piece_info in bin_info['placed_pieces']:
+        piece_name = piece_info['name']
+        if piece_name not in transformed_pieces_data:
+            continue
+        if piece_name not in forms:
+            original_vertices, rotation_pivot, _ = transformed_pieces_data[piece_name]
+            local_vertices = [(x - rotation_pivot[0], y - rotation_pivot[1]) for x, y in original_vertices]
+            outline_key = shape_key(local_vertices)
+            mirror_key = shape_key([(-x, y) for x, y in local_vertices])
+            if outline_key in forms:
+                forms[piece_name] = forms[outline_key]
+            elif mirror_key in forms:
+                form_name, hull, label_point, size, _ = forms[mirror_key]
+                width = hull[:, 0].max()
+                forms[piece_name] = (form_name, np.column_stack([width - hull[:, 0], hull[:, 1]]),
+                                     Point(width - label_point.x, label_point.y), size, width)
+            else:
+                form_name = f"piece{len(forms)}"
+                c.beginForm(form_name)
+                p = c.beginPath()
+                p.moveTo(local_vertices[0][0], local_vertices[0][1])
+                for point in local_vertices[1:]:
+                    p.lineTo(point[0], point[1])
+                p.close()
+                c.drawPath(p, fill=1, stroke=1)
+                c.endForm()
+                hull = np.asarray(MultiPoint(local_vertices).convex_hull.exterior.coords
+                                  if len(local_vertices) > 2 else local_vertices).reshape(-1, 2)
+                forms[outline_key] = forms[piece_name] = (form_name, hull) + _label_anchor(local_vertices) + (None,)
+        form_name, hull, label_point, size, mirror_width = forms[piece_name]
+
+        angle_rad = math.radians(piece_info['rotation'])
+        cos_theta, sin_theta = math.cos(angle_rad), math.sin(angle_rad)
+        tx = piece_info['x'] - (cos_theta * hull[:, 0] - sin_theta * hull[:, 1]).min()
+        ty = piece_info['y'] - (sin_theta * hull[:, 0] + cos_theta * hull[:, 1]).min()
+
+        c.saveState()
+        c.setFillColor(fill_color)
+        c.setStrokeColor(colors.blue)
+        c.setLineWidth(0.5)
+        c.transform(cos_theta, sin_theta, -sin_theta, cos_theta, tx, ty)
+        if mirror_width is not None:
+            c.transform(-1, 0, 0, 1, mirror_width, 0)
+        c.doForm(form_name)
+        c.restoreState()
+
+        landscape_x = cos_theta * label_point.x - sin_theta * label_point.y + tx
+        landscape_y = sin_theta * label_point.x + cos_theta * label_point.y + ty
+        labels_to_draw.append((piece_name, (bin_height - landscape_y + margin, landscape_x + margin), size))
+    c.restoreState()
+    for label, label_point, size in labels_to_draw:
+        draw_label(c, font, label, label_point, size)
+
+def create_packing_visual_pdf(bins_data, transformed_pieces_data, file_name="output.pdf", use_forms=False):
+    """Creates the PDF visualization of the packed pieces.
+
+    With `use_forms`, pieces are written once as PDF forms and placed by
+    transform (see draw_bin_with_forms).
+    """
     c = canvas.Canvas(file_name)
     font = Romans()
     fill_color = colors.Color(0.9, 0.9, 0.9, alpha=0.7)
@@ -205,6 +318,7 @@ def create_packing_visual_pdf(bins_data, transformed_pieces_data, file_name="out
 
     PAGE_WIDTH = BIN_HEIGHT + 2 * MARGIN
     PAGE_HEIGHT = BIN_WIDTH + 2 * MARGIN
+    forms = {}
 
     for bin_info in bins_data:
         
@@ -214,6 +328,11 @@ def create_packing_visual_pdf(bins_data, transformed_pieces_data, file_name="out
         c.setLineWidth(1)
         c.rect(MARGIN, MARGIN, BIN_HEIGHT, BIN_WIDTH)
 
+        if use_forms:
+            draw_bin_with_forms(c, font, bin_info, transformed_pieces_data, forms, fill_color, BIN_HEIGHT, MARGIN)
+            c.showPage();
+            continue
+
         pieces_to_draw = []
 
         for piece_info in bin_info['placed_pieces']:
@@ -271,102 +390,9 @@ def create_packing_visual_pdf(bins_data, transformed_pieces_data, file_name="out
                 size = distance * 2
 
             # Transform the label point to portrait coordinates
-            label_point = Point(BIN_HEIGHT - label_point_landscape.y + MARGIN, label_point_landscape.x + MARGIN)
-
-            c.setLineWidth(1);
-
-            label = piece['name']
-            main_font_scale = size / 80;
-            secondary_font_scale = main_font_scale * 0.5;
-
-            if ')' in label:
-                label_part = label.replace(')', '');
-                parts = label_part.split('-', 1);
-                main_text = parts[0];
-                secondary_text = parts[1].replace('-', '') if len(parts) > 1 else '';
+            label_point = (BIN_HEIGHT - label_point_landscape.y + MARGIN, label_point_landscape.x + MARGIN)
 
-                font.scale = main_font_scale;
-                main_width = font.get_string_length(main_text);
-                main_paths = font.get_string(main_text);
-                
-                font.scale = secondary_font_scale;
-                secondary_width = font.get_string_length(secondary_text);
-                secondary_paths = font.get_string(secondary_text);
-
-                total_width = main_width + secondary_width;
-                x_offset = label_point.x - total_width / 2;
-                y_offset = label_point.y - 10 * main_font_scale;
-
-                c.setStrokeColor(colors.red);
-                font.scale = main_font_scale;
-                for path in main_paths:
-                    path_obj = c.beginPath();
-                    path_obj.moveTo(path[0][0] + x_offset, path[0][1] + y_offset);
-                    for point in path[1:]:
-                        path_obj.lineTo(point[0] + x_offset, point[1] + y_offset);
-                    c.drawPath(path_obj);
-
-                x_offset += main_width;
-                y_offset_secondary = y_offset + (50 * main_font_scale) * 0.2
-
-                c.setStrokeColor(colors.black);
-                font.scale = secondary_font_scale;
-                for path in secondary_paths:
-                    path_obj = c.beginPath();
-                    path_obj.moveTo(path[0][0] + x_offset, path[0][1] + y_offset_secondary);
-                    for point in path[1:]:
-                        path_obj.lineTo(point[0] + x_offset, point[1] + y_offset_secondary);
-                    c.drawPath(path_obj);
-
-            elif '-' in label:
-                parts = label.split('-', 1);
-                main_text = parts[0];
-                secondary_text = parts[1].replace('-', '');
-
-                font.scale = main_font_scale;
-                main_width = font.get_string_length(main_text);
-                main_paths = font.get_string(main_text);
-
-                font.scale = secondary_font_scale;
-                secondary_width = font.get_string_length(secondary_text);
-                secondary_paths = font.get_string(secondary_text);
-
-                total_width = main_width + secondary_width;
-                x_offset = label_point.x - total_width / 2;
-                y_offset = label_point.y - 10 * main_font_scale;
-
-                c.setStrokeColor(colors.red);
-                font.scale = main_font_scale;
-                for path in main_paths:
-                    path_obj = c.beginPath();
-                    path_obj.moveTo(path[0][0] + x_offset, path[0][1] + y_offset);
-                    for point in path[1:]:
-                        path_obj.lineTo(point[0] + x_offset, point[1] + y_offset);
-                    c.drawPath(path_obj);
-
-                x_offset += main_width;
-                c.setStrokeColor(colors.green);
-                font.scale = secondary_font_scale;
-                for path in secondary_paths:
-                    path_obj = c.beginPath();
-                    path_obj.moveTo(path[0][0] + x_offset, path[0][1] + y_offset);
-                    for point in path[1:]:
-                        path_obj.lineTo(point[0] + x_offset, point[1] + y_offset);
-                    c.drawPath(path_obj);
-
-            else:
-                c.setStrokeColor(colors.red);
-                font.scale = main_font_scale;
-                text_width = font.get_string_length(label);
-                paths = font.get_string(label);
-                x_offset = label_point.x - text_width / 2;
-                y_offset = label_point.y - 10 * font.scale;
-                for path in paths:
-                    path_obj = c.beginPath();
-                    path_obj.moveTo(path[0][0] + x_offset, path[0][1] + y_offset);
-                    for point in path[1:]:
-                        path_obj.lineTo(point[0] + x_offset, point[1] + y_offset);
-                    c.drawPath(path_obj);
+            draw_label(c, font, piece['name'], label_point, size)
         c.showPage();
     c.save();
 
@@ -376,6 +402,15 @@ def main():
     bins_data = None
     transformed_pieces_data = None
     first_tag = "output"
+    unresolved = []
+
+    use_forms = '--forms' in sys.argv
+    if use_forms:
+        sys.argv.remove('--forms')
+    # Registered slices are already in the orientation of the nesting.
+    flip = '--registered' not in sys.argv
+    if not flip:
+        sys.argv.remove('--registered')
 
     if len(sys.argv) == 2:
         # Single file argument, assume it's a zip file
@@ -390,8 +425,8 @@ def main():
                 positions_content = zip_ref.read('positions.txt').decode('utf-8')
                 
                 with io.StringIO(slices_content) as slices_io, io.StringIO(positions_content) as positions_io:
-                    transformed_pieces_data, first_tag = parse_and_transform_slices(slices_io)
-                    bins_data = parse_posiciones_file(positions_io)
+                    transformed_pieces_data, first_tag, tag_index = parse_and_transform_slices(slices_io, flip)
+                    bins_data = parse_posiciones_file(positions_io, tag_index, unresolved)
 
         except (zipfile.BadZipFile, KeyError) as e:
             print(f"Error processing zip file: {e}")
@@ -403,23 +438,27 @@ def main():
         positions_file_path = sys.argv[2]
         try:
             with open(slices_file_path, 'r') as f_slices:
-                transformed_pieces_data, first_tag = parse_and_transform_slices(f_slices)
+                transformed_pieces_data, first_tag, tag_index = parse_and_transform_slices(f_slices, flip)
             with open(positions_file_path, 'r') as f_pos:
-                bins_data = parse_posiciones_file(f_pos)
+                bins_data = parse_posiciones_file(f_pos, tag_index, unresolved)
         except FileNotFoundError as e:
             print(f"Error: {e}")
             sys.exit(1)
     else:
-        print("Usage: python visualize_transformed_slices_v2_portrait.py <zip_file> | <slices_file> <positions_file>")
+        print("Usage: python visualize_transformed_slices_v2_portrait.py [--forms] [--registered] <zip_file> | <slices_file> <positions_file>")
         sys.exit(1)
 
+    if unresolved:
+        print(f"Warning: {len(unresolved)} placements could not be matched to a slice: "
+              f"{', '.join(sorted(set(unresolved)))}")
+
     if not bins_data or not transformed_pieces_data:
         print("Error: Failed to parse input files.")
         sys.exit(1)
 
     output_filename = f"{first_tag.split('-')[0]}_v2_portrait.pdf"
     
-    create_packing_visual_pdf(bins_data, transformed_pieces_data, file_name=output_filename)
+    create_packing_visual_pdf(bins_data, transformed_pieces_data, file_name=output_filename, use_forms=use_forms)
     print(f"PDF saved to {output_filename}")
 
 if __name__ == "__main__":